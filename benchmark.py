@@ -0,0 +1,350 @@
+import json
+import os
+import re
+import sys
+import time
+import math
+import queue
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import urllib.parse
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SEARCH_SIZE = 20
+FILING_SIZE = 25
+
+class FixtureSite:
+    '''
+    Synthetic Companies House site, every search returns the configured number of companies and every company
+    has the configured number of officers and filings. Pages are generated on the fly with the same markup the
+    scraper reads from the live site, the same data is served as REST API resources under "/api", and an
+    optional latency is added to every response.
+    '''
+
+    def __init__(self, companies: int = 100, officers: int = 5, filings: int = 30, latency: float = 0.0):
+        self.companies = companies
+        self.officers = officers
+        self.filings = filings
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def search(self, query: str, page: int):
+        start = (page - 1) * SEARCH_SIZE
+        if start >= self.companies:
+            return 404, '<html><body><h1 id="page-not-found-header">Page not found</h1></body></html>'
+        rows = []
+        for index in range(start, min(self.companies, start + SEARCH_SIZE), 1):
+            code = '%08d' % index
+            rows.append('<li class="type-company"><h3><a class="govuk-link" href="/company/' + code + '">' + query.upper() + ' COMPANY ' + str(index) + ' LIMITED</a></h3>'
+                + '<p class="meta crumbtrail"><strong>' + code + '</strong> - Incorporated on 1 January 2000</p><p>' + str(index + 1) + ' High Street, London</p></li>')
+        return 200, ('<html><head><title>Search - Find and update company information</title></head><body>'
+            + '<div id="search-meta"><p class="search-meta">' + '{:,}'.format(self.companies) + ' matches found</p></div>'
+            + '<ul id="results" class="results-list">' + ''.join(rows) + '</ul></body></html>')
+
+    def company(self, code: str):
+        return 200, ('<html><head><title>Company overview</title></head><body><div id="content-container"><h1>COMPANY ' + code + '</h1>'
+            + '<dl><dt>Registered office address</dt><dd class="text data">1 High Street, London, EC1 1AA</dd></dl>'
+            + '<dl><dt>Company status</dt><dd id="company-status">Active</dd></dl>'
+            + '<dl><dt>Company type</dt><dd id="company-type">Private limited Company</dd></dl>'
+            + '<dl><dt>Incorporated on</dt><dd id="company-creation-date">1 January 2000</dd></dl></div></body></html>')
+
+    def officer(self, number: int):
+        text = str(number)
+        return ('<div class="appointment-' + text + '"><h2><span id="officer-name-' + text + '"><a href="/officers/' + text + '/appointments">SMITH, John ' + text + '</a></span></h2>'
+            + '<dl><dt>Correspondence address</dt><dd id="officer-address-value-' + text + '">1 High Street, London</dd></dl>'
+            + '<dl><dt>Role <span id="officer-status-tag-' + text + '" class="status-tag"></span></dt><dd id="officer-role-' + text + '">Director</dd></dl>'
+            + '<dl><dt>Date of birth</dt><dd id="officer-date-of-birth-' + text + '">March 1970</dd></dl>'
+            + '<dl><dt>Appointed on</dt><dd id="officer-appointed-on-' + text + '">1 January 2000</dd></dl>'
+            + '<dl><dt>Nationality</dt><dd id="officer-nationality-' + text + '">British</dd></dl>'
+            + '<dl><dt>Country of residence</dt><dd id="officer-country-of-residence-' + text + '">England</dd></dl>'
+            + '<dl><dt>Occupation</dt><dd id="officer-occupation-' + text + '">Director</dd></dl></div>')
+
+    def people(self, code: str):
+        items = [self.officer(number) for number in range(1, self.officers + 1, 1)]
+        return 200, '<html><head><title>People</title></head><body><div class="appointments-list">' + ''.join(items) + '</div></body></html>'
+
+    def history(self, code: str, page: int):
+        rows = ['<tr><th>Date</th><th>Type</th><th>Description</th><th>View / Download</th></tr>']
+        first = self.filings - 1 - (page - 1) * FILING_SIZE
+        for index in range(first, max(-1, first - FILING_SIZE), -1):
+            rows.append('<tr><td class="nowrap">' + str(index % 28 + 1) + ' Jan 2020</td><td class="filing-type help-tooltip js-hidden">CS01</td>'
+                + '<td><strong>Confirmation statement</strong> made on ' + str(index % 28 + 1) + ' January 2020</td>'
+                + '<td><a href="/company/' + code + '/filing-history/F' + str(index) + '/document?format=pdf">View PDF</a></td></tr>')
+        pager = ''
+        if page * FILING_SIZE < self.filings:
+            pager = '<ul class="pager"><li><a class="page" id="next-page" href="?page=' + str(page + 1) + '">Next</a></li></ul>'
+        return 200, ('<html><head><title>Filing history</title></head><body><div id="filing-history-content">'
+            + '<table id="fhTable" class="full-width-table">' + ''.join(rows) + '</table>' + pager + '</div></body></html>')
+
+    def resource(self, path: str, query: dict):
+        start = int(query.get('start_index', ['0'])[0])
+        size = int(query.get('items_per_page', ['20'])[0])
+        if path == '/search/companies':
+            items = []
+            for index in range(start, min(self.companies, start + size), 1):
+                code = '%08d' % index
+                items.append({ 'title': query.get('q', [''])[0].upper() + ' COMPANY ' + str(index) + ' LIMITED', 'company_number': code, 'links': { 'self': '/company/' + code } })
+            return 200, { 'total_results': self.companies, 'start_index': start, 'items_per_page': size, 'items': items }
+        match = re.match(r'^/company/(\w+)(/officers|/filing-history)?$', path)
+        if match is None:
+            return 404, { 'errors': [{ 'error': 'not-found' }] }
+        code = match.group(1)
+        if match.group(2) == '/officers':
+            items = []
+            for number in range(start + 1, min(self.officers, start + size) + 1, 1):
+                items.append({ 'name': 'SMITH, John ' + str(number), 'officer_role': 'director', 'appointed_on': '2000-01-01', 'nationality': 'British', 'country_of_residence': 'England', 'occupation': 'Director',
+                    'date_of_birth': { 'month': 3, 'year': 1970 }, 'address': { 'address_line_1': '1 High Street', 'locality': 'London' } })
+            return 200, { 'total_results': self.officers, 'items': items }
+        if match.group(2) == '/filing-history':
+            items = []
+            for index in range(self.filings - 1 - start, max(-1, self.filings - 1 - start - size), -1):
+                items.append({ 'transaction_id': 'F' + str(index), 'date': '2020-01-' + '%02d' % (index % 28 + 1), 'type': 'CS01', 'description': 'confirmation-statement',
+                    'description_values': { 'made_up_date': '2020-01-' + '%02d' % (index % 28 + 1) }, 'links': { 'self': '/company/' + code + '/filing-history/F' + str(index), 'document_metadata': 'https://document-api/F' + str(index) } })
+            return 200, { 'total_count': self.filings, 'items': items }
+        return 200, { 'company_name': 'COMPANY ' + code, 'company_number': code, 'company_status': 'active', 'type': 'ltd', 'date_of_creation': '2000-01-01',
+            'registered_office_address': { 'address_line_1': '1 High Street', 'locality': 'London', 'postal_code': 'EC1 1AA' } }
+
+    def route(self, path: str):
+        parts = urllib.parse.urlsplit(path)
+        query = urllib.parse.parse_qs(parts.query)
+        if parts.path.startswith('/api/'):
+            status, data = self.resource(parts.path[4:], query)
+            return status, json.dumps(data), 'application/json'
+        status, text = self.page(parts, query)
+        return status, text, 'text/html; charset=utf-8'
+
+    def page(self, parts, query: dict):
+        page = int(query.get('page', ['1'])[0])
+        if parts.path == '/search/companies':
+            return self.search(query.get('q', [''])[0], page)
+        match = re.match(r'^/company/(\w+)(/officers|/filing-history)?$', parts.path)
+        if match is None:
+            return 404, '<html><body><h1 id="page-not-found-header">Page not found</h1></body></html>'
+        if match.group(2) == '/officers':
+            return self.people(match.group(1))
+        if match.group(2) == '/filing-history':
+            return self.history(match.group(1), page)
+        return self.company(match.group(1))
+
+    def start(self):
+        self._server = FixtureServer(('127.0.0.1', 0), FixtureHandler)
+        self._server.site = self
+        threading.Thread(target = self._server.serve_forever, name = "Fixture", daemon = True).start()
+        return 'http://127.0.0.1:' + str(self._server.server_address[1])
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def reset(self):
+        with self._lock:
+            count = self.requests
+            self.requests = 0
+        return count
+
+    def stop(self):
+        if not self._server is None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class FixtureServer ( ThreadingHTTPServer ):
+    request_queue_size = 1024
+    daemon_threads = True
+
+class FixtureHandler ( BaseHTTPRequestHandler ):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        site = self.server.site
+        site.count()
+        if site.latency > 0:
+            time.sleep(site.latency)
+        status, text, ctype = site.route(self.path)
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def run_scenario(landing: str, scenario: dict, output: str, results):
+    '''
+    Run one scraper dispatch against the fixture site inside a child process and put its figures to the results queue.
+    @param landing The fixture site URL
+    @param scenario The engine, threads and processes to run with
+    @param output The output folder of the run
+    @param results The queue receiving the figures
+    '''
+    import io
+    import contextlib
+    buffer = io.StringIO()
+    try:
+        from chscraper import ScrapSettings, ScrapProvider
+        settings = ScrapSettings([scenario['query']], output)
+        settings.landing = landing
+        settings.engine = scenario['engine']
+        settings.thread = scenario['threads']
+        settings.procs = scenario['processes']
+        settings.mrows = scenario['companies']
+        settings.mpage = 0
+        settings.rate = 0.0
+        settings.ratemax = 0.0
+        settings.stream = scenario['stream']
+        if settings.engine == 'api':
+            settings.apiurl = landing + '/api'
+            settings.apikey = 'benchmark'
+            settings.apibudget = 1000000
+        provider = ScrapProvider(settings)
+        first = time.perf_counter()
+        with contextlib.redirect_stdout(buffer):
+            paths = provider.dispatch()
+        elapsed = time.perf_counter() - first
+        metrics = dict()
+        path = os.path.join(os.path.dirname(paths[0]), 'metrics.json')
+        if os.path.isfile(path):
+            with open(path, 'r') as file:
+                metrics = json.loads(file.read())
+    except Exception as e:
+        results.put({ 'error': str(e) })
+        return
+    summary = metrics.get('summary', dict())
+    companies = 0
+    for counter in metrics.get('counters', []):
+        if counter['name'] == 'companies':
+            companies += counter['value']
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1.0 if sys.platform == 'darwin' else 1024.0
+    results.put({ 'elapsed': elapsed, 'companies': companies, 'rss': max(own, kids) * scale / 1048576.0, 'output': summary.get('output', dict()).get('sum', 0.0) })
+
+def wait_scenario(process, results):
+    '''
+    Wait for the figures of a scenario process, returns an error entry instead when the process exits without them.
+    '''
+    while True:
+        try:
+            return results.get(timeout = 1.0)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            try:
+                return results.get(timeout = 1.0)
+            except queue.Empty:
+                return { 'error': 'the scenario process exited with code ' + str(process.exitcode) + ' without reporting' }
+
+def benchmark(site: FixtureSite, scenarios: list, folder: str):
+    '''
+    Run every scenario in its own process so the peak RSS of a run is not inflated by the previous ones.
+    '''
+    landing = site.start()
+    report = []
+    try:
+        for scenario in scenarios:
+            output = os.path.join(folder, scenario['name'])
+            shutil.rmtree(output, ignore_errors = True)
+            site.reset()
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target = run_scenario, args = (landing, scenario, output, results))
+            process.start()
+            data = wait_scenario(process, results)
+            process.join()
+            if 'error' in data:
+                raise Exception('The scenario "' + scenario['name'] + '" failed: ' + data['error'])
+            pages = site.reset()
+            elapsed = max(data['elapsed'], 1e-6)
+            node = dict(scenario)
+            node['seconds'] = round(elapsed, 3)
+            node['companies_sec'] = round(data['companies'] / elapsed, 2)
+            node['pages_sec'] = round(pages / elapsed, 2)
+            node['pages'] = pages
+            node['peak_rss_mb'] = round(data['rss'], 1)
+            node['write_sec'] = round(data['output'], 3)
+            report.append(node)
+            print("> " + scenario['name'] + ": " + str(node['companies_sec']) + " companies/sec, " + str(node['pages_sec']) + " pages/sec, peak RSS " + str(node['peak_rss_mb']) + " MB, writing " + str(node['write_sec']) + " sec.")
+    finally:
+        site.stop()
+    return report
+
+def compare(report: list, baseline: list, tolerance: float):
+    '''
+    Compare the throughput of every scenario with the same scenario in a previous report, returns the regressed names.
+    '''
+    previous = dict()
+    for node in baseline:
+        previous[node['name']] = node
+    regressed = []
+    for node in report:
+        last = previous.get(node['name'], None)
+        if last is None or last['companies_sec'] <= 0:
+            continue
+        change = (node['companies_sec'] - last['companies_sec']) / last['companies_sec']
+        print("> " + node['name'] + ": " + '{:+.1f}'.format(change * 100) + "% companies/sec against the baseline.")
+        if change < -tolerance:
+            regressed.append(node['name'])
+    return regressed
+
+def parse_list(text: str, kind = str):
+    return [kind(item.strip()) for item in text.split(',') if len(item.strip()) > 0]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Benchmark the scraper against a local synthetic Companies House site.")
+    parser.add_argument("--companies", type = int, help = "Optional, the number of companies matched by the search. Default to 200.", default = 200, metavar = "number")
+    parser.add_argument("--officers", type = int, help = "Optional, the number of officers of every company. Default to 5.", default = 5, metavar = "number")
+    parser.add_argument("--filings", type = int, help = "Optional, the number of filings of every company. Default to 30.", default = 30, metavar = "number")
+    parser.add_argument("--latency", type = float, help = "Optional, the latency added to every response in milliseconds. Default to 20.", default = 20.0, metavar = "ms")
+    parser.add_argument("--engines", type = str, help = "Optional, the comma separated engines to run, \"browser\" needs Chrome and \"api\" reads the mock REST API of the fixture. Default to \"http,async\".", default = "http,async", metavar = "list")
+    parser.add_argument("--threads", type = str, help = "Optional, the comma separated thread counts to run. Default to \"1,4,16\".", default = "1,4,16", metavar = "list")
+    parser.add_argument("--processes", type = str, help = "Optional, the comma separated process counts to run. Default to \"0\".", default = "0", metavar = "list")
+    parser.add_argument("--stream", action = "store_true", help = "Optional, stream the results to JSON Lines instead of results.json.")
+    parser.add_argument("--output", type = str, help = "Optional, the folder receiving the runs and report.json. Default to a temporary folder.", default = None, metavar = "path")
+    parser.add_argument("--baseline", type = str, help = "Optional, a previous report.json to compare with, exits with code 1 when a scenario regressed.", default = None, metavar = "path")
+    parser.add_argument("--tolerance", type = float, help = "Optional, the allowed companies/sec drop against the baseline. Default to 0.1 (10%%).", default = 0.1, metavar = "ratio")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    folder = args.output if not args.output is None else tempfile.mkdtemp(prefix = 'chscraper-bench-')
+    folder = os.path.abspath(folder)
+    os.makedirs(folder, 0o777, True)
+    scenarios = []
+    for engine in parse_list(args.engines):
+        for processes in parse_list(args.processes, int):
+            if engine == 'async' and processes > 1:
+                continue
+            counts = parse_list(args.threads, int) if engine != 'async' else [1]
+            for threads in counts:
+                name = engine + '-t' + str(threads) + ('-p' + str(processes) if processes > 1 else '')
+                scenarios.append({ 'name': name, 'engine': engine, 'threads': threads, 'processes': processes, 'companies': args.companies, 'stream': args.stream, 'query': 'benchmark' })
+    site = FixtureSite(args.companies, args.officers, args.filings, args.latency / 1000.0)
+    print("> Benchmarking " + str(len(scenarios)) + " scenarios with " + str(args.companies) + " companies, " + str(args.officers) + " officers and " + str(args.filings) + " filings (" + str(int(math.ceil(args.filings / FILING_SIZE))) + " history pages) each..")
+    try:
+        report = benchmark(site, scenarios, folder)
+    except Exception as e:
+        print("> Benchmark Error: " + str(e))
+        return 1
+    path = os.path.join(folder, 'report.json')
+    with open(path, 'w') as file:
+        file.write(json.dumps({ 'fixture': { 'companies': args.companies, 'officers': args.officers, 'filings': args.filings, 'latency': args.latency }, 'scenarios': report }, indent = 4))
+    print("> Benchmark report saved at: " + path)
+    if not args.baseline is None:
+        with open(args.baseline, 'r') as file:
+            baseline = json.loads(file.read()).get('scenarios', [])
+        regressed = compare(report, baseline, args.tolerance)
+        if len(regressed) > 0:
+            print("> Throughput regressed in: " + ", ".join(regressed))
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,34 @@
 import json
 import os
 import urllib
-import xlsxwriter
+import urllib.parse
+import http.client
+import gzip
+import ssl
+import asyncio
+import hashlib
+import base64
+import zlib
 import argparse
 import time
+import math
+import random
 import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from threading import Thread
+import cProfile
+import pstats
+import sys
+import io
+import csv
+import zipfile
+import sqlite3
+import importlib.util
+from html.parser import HTMLParser
+from threading import Thread, Lock, Event, Condition
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+from multiprocessing import Process
+import multiprocessing
+from queue import Queue, Empty, Full
 
 def find_element_by_id(source, id):
     ''' 
@@ -279,6 +298,94 @@ def convertint(data):
     else:
         return 0
 
+def convertfloat(data):
+    '''
+    Convert the given data to a float number and returns zero when failed
+    '''
+    if data is None:
+        return 0.0
+    elif isinstance(data, bool):
+        return 1.0 if data != False else 0.0
+    elif isinstance(data, (int, float)):
+        return float(data)
+    elif isinstance(data, str):
+        return float(data)
+    else:
+        return 0.0
+
+def convertdict(data):
+    '''
+    Try to convert the given data into a dictionary data type, returns empty dictionary if failed.
+    '''
+    if isinstance(data, dict):
+        return data
+    elif isinstance(data, str) and len(data.strip()) > 0:
+        try:
+            value = json.loads(data)
+            return value if isinstance(value, dict) else {}
+        except:
+            return {}
+    else:
+        return {}
+
+THROTTLE_TITLES = set(['too many requests', '429 too many requests', 'service unavailable', '503 service unavailable', 'bad gateway', '502 bad gateway',
+    'gateway timeout', '504 gateway timeout', 'internal server error', '500 internal server error', 'sorry, there is a problem with the service'])
+
+RETRY_LIMIT = 6
+PAGE_RETRIES = 2
+
+WORKER_POLL = 1.0
+
+METRIC_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+CACHE_TTLS = { 'search': 86400, 'company': 86400, 'officers': 86400, 'filings': 86400, 'missing': 21600 }
+
+API_PAGE = 100
+
+API_WINDOW = 300
+
+API_TYPES = {
+    'ltd': 'Private limited Company',
+    'plc': 'Public limited Company',
+    'llp': 'Limited liability partnership',
+    'private-unlimited': 'Private unlimited Company',
+    'private-unlimited-nsc': 'Private unlimited company without share capital',
+    'private-limited-guarant-nsc': 'PRI/LTD BY GUAR/NSC (Private, limited by guarantee, no share capital)',
+    'private-limited-guarant-nsc-limited-exemption': "PRI/LBG/NSC (Private, Limited by guarantee, no share capital, use of 'Limited' exemption)",
+    'private-limited-shares-section-30-exemption': "PRI/LTD SECT. 30 (Private limited company, use of 'Limited' exemption)",
+    'limited-partnership': 'Limited partnership',
+    'scottish-partnership': 'Scottish qualifying partnership',
+    'charitable-incorporated-organisation': 'Charitable incorporated organisation',
+    'scottish-charitable-incorporated-organisation': 'Scottish charitable incorporated organisation',
+    'oversea-company': 'Overseas entity',
+    'registered-society-non-jurisdictional': 'Registered society',
+    'royal-charter': 'Royal charter company',
+    'community-interest-company': 'Community interest company'
+}
+
+API_DESCRIPTIONS = {
+    'confirmation-statement': 'Confirmation statement made on {made_up_date}',
+    'confirmation-statement-with-updates': 'Confirmation statement made on {made_up_date} with updates',
+    'confirmation-statement-with-no-updates': 'Confirmation statement made on {made_up_date} with no updates',
+    'accounts-with-accounts-type-full': 'Full accounts made up to {made_up_date}',
+    'accounts-with-accounts-type-small': 'Accounts for a small company made up to {made_up_date}',
+    'accounts-with-accounts-type-micro-entity': 'Micro company accounts made up to {made_up_date}',
+    'accounts-with-accounts-type-dormant': 'Accounts for a dormant company made up to {made_up_date}',
+    'accounts-with-accounts-type-total-exemption-full': 'Total exemption full accounts made up to {made_up_date}',
+    'annual-return-company-with-made-up-date-full-list-shareholders': 'Annual return made up to {made_up_date} with full list of shareholders',
+    'appoint-person-director-company-with-name-date': 'Appointment of {officer_name} as a director on {appointment_date}',
+    'termination-director-company-with-name-termination-date': 'Termination of appointment of {officer_name} as a director on {termination_date}',
+    'change-registered-office-address-company-with-date-old-address-new-address': 'Registered office address changed from {old_address} to {new_address} on {change_date}',
+    'incorporation-company': 'Incorporation'
+}
+
+LEAN_BLOCKED = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp",
+    "*.woff", "*.woff2", "*.ttf", "*.eot", "*.otf",
+    "*.css", "*govuk-frontend*", "*/javascripts/vendor/*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*hotjar.com*"
+]
+
 def parse_args(args = None):
     '''
     Parse the given command arguments list into the dictionary objects
@@ -289,9 +396,10 @@ def parse_args(args = None):
         return args
     elif isinstance(args, list):
         parser = argparse.ArgumentParser(description="Companies house site web scraper configuration arguments")
-        parser.add_argument("--query", type = str, help = "The company names to search, use comma as separator of companies.", required = True, metavar = "string")
+        parser.add_argument("--query", type = str, help = "The company names to search, use comma as separator of companies. Not needed in daemon mode.", required = False, metavar = "string")
         parser.add_argument("--output", type = str, help = "The output directory where the scraping results will saved.", required = True, metavar = "path")
         parser.add_argument("--limit", type = int, help = "Optional, the maximum number of records to scrap, set with zero or omit this argument to scrap all records. Default to 10 records.", default = 10, required=True, metavar = "number")
+        parser.add_argument("--match", type = float, help = "Optional, the minimum name matching score between 0 and 1 a search hit needs to be crawled, the names are compared without legal suffixes, punctuation and stop words. Default to 0 (disabled).", default = 0.0, required = False, metavar = "score")
         parser.add_argument("--pages", type = int, help = "Optional, the maximum number of pages to scrap, set with zero to scrap all pages. Default to 1 page.", default = 1, required = False, metavar = "number")
         parser.add_argument("--hidden", type = bool, help='Optional, set with True to make headless (invisible) scraper browser, otherwise, set False to show the scraper browser (debug mode).', default = True, metavar= 'boolean')
         parser.add_argument("--threads", type = int, help = "Optional, the maximum number of threads to be used by scraper.", default = os.cpu_count(), required = False, metavar = "number")
@@ -300,20 +408,37 @@ def parse_args(args = None):
         parser.add_argument("--binary", type = str, help = "The path to the driver executable binary file to be used, omit this parameter to use default path.", required = False, metavar ="path")
         parser.add_argument("--options", type = str, help = "The driver arguments list to use, use comma as separator between arguments.", required = False, metavar = "string")
         parser.add_argument("--exclusion", type = str, help =" The driver exclusion argument list to use, use comma as separator between arguments.", required = False, metavar = "string")
+        parser.add_argument("--incremental", type = convertbool, help = "Optional, set True to only crawl filing histories newer than the ones saved in the previous results of the output directory.", default = False, required = False, metavar = "boolean")
+        parser.add_argument("--hpages", type = int, help = "Optional, the maximum number of filing history pages to scrap per company, set with zero (default) to scrap all pages.", default = 0, required = False, metavar = "number")
+        parser.add_argument("--cache", type = convertbool, help = "Optional, set True to keep the fetched pages in the persistent page cache and reuse them in the next runs.", default = False, required = False, metavar = "boolean")
+        parser.add_argument("--resume", type = convertbool, help = "Optional, set True to resume the interrupted run from the journal in the output directory instead of starting over.", default = False, required = False, metavar = "boolean")
+        parser.add_argument("--daemon", type = int, help = "Optional, run as a job server on http://127.0.0.1:<port> with warm drivers instead of scraping once, jobs are posted to \"/jobs\". Default to 0 (disabled).", default = 0, required = False, metavar = "port")
+        parser.add_argument("--jobs", type = int, help = "Optional, the maximum number of jobs the daemon runs at the same time. Default to 2.", default = 2, required = False, metavar = "number")
+        parser.add_argument("--index", type = str, help = "Optional, the path to the offline company index, when set the queries are resolved from the index instead of the live search.", required = False, metavar = "path")
+        parser.add_argument("--import", type = str, help = "Optional, the path to the Companies House \"basic company data\" CSV snapshot (or its zip file) to import into the \"--index\" file before scraping.", required = False, metavar = "path")
+        parser.add_argument("--profile", type = convertbool, help = "Optional, set True to profile the crawl and output stages of every worker and write \"profile.pstats\" and \"profile.collapsed\" into the output directory.", default = False, required = False, metavar = "boolean")
+        parser.add_argument("--stream", type = convertbool, help = "Optional, set True to stream every company into \"results.jsonl\" as soon as it is scraped instead of writing \"results.json\" at the end.", default = False, required = False, metavar = "boolean")
+        parser.add_argument("--parquet", type = convertbool, help = "Optional, set True to also write the companies, officers and filings as typed Parquet tables into the output directory, needs the \"pyarrow\" package.", default = False, required = False, metavar = "boolean")
+        parser.add_argument("--processes", type = int, help = "Optional, the number of worker processes to crawl with, every process runs its own drivers and threads. Set with zero (default) to crawl inside this process only.", default = 0, required = False, metavar = "number")
+        parser.add_argument("--engine", type = str, help = "Optional, the page fetching engine, either \"browser\" (default) to load every page in Chrome, \"http\" to fetch static pages over HTTP and only fall back to Chrome for scripted pages, \"async\" to fetch them with asyncio, or \"api\" to read the Companies House REST API (selected automatically when a token is given).", default = "browser", required = False, metavar = "string")
+        parser.add_argument("--token", type = str, help = "Optional, the Companies House REST API key, setting it switches the default engine to \"api\".", required = False, metavar = "string")
+        parser.add_argument("--rate", type = float, help = "Optional, the starting number of page requests per second shared by every worker, the rate adapts to throttling up to \"scrap_rate_max\". Zero disables pacing. Default to 5.", default = 5.0, required = False, metavar = "number")
+        parser.add_argument("--metrics", type = int, help = "Optional, serve the run metrics in Prometheus text format at http://127.0.0.1:<port>/metrics while scraping. Default to 0 (disabled).", default = 0, required = False, metavar = "port")
+        parser.add_argument("--concurrency", type = int, help = "Optional, the maximum number of concurrent page fetches of the \"async\" engine. Default to 100.", default = 100, required = False, metavar = "number")
         return vars(parser.parse_args(args))
     
     else:
         return None
 
-def runtime_config():
+def runtime_config(args = None):
     '''
     Read and parse the active runtime settings dictionary for the current instance.
     If the command line arguments is supplied, then it parsed and used as settings.
     Otherwise, this function will search and load the persistent configuration file.
+    @param args The command line arguments without the program name, default to the arguments of the process
     '''
-    cmd = os.sys.argv
-    if len(cmd) > 1:
-        cmd.remove(cmd[0])
+    cmd = sys.argv[1:] if args is None else list(args)
+    if len(cmd) > 0:
         map = parse_args(cmd)
         if not map is None:
             result = dict()
@@ -333,7 +458,7 @@ def runtime_config():
                     if not isundefined(sub):
                         data.append(sub.strip())
                 result['company_names'] = data
-            if isundefined(result['company_names']):
+            if isundefined(result['company_names']) and convertint(map['daemon']) < 1 and isundefined(map['import']):
                 raise Exception('The "--query" argument is needed and must contains one or more company names to query, every of queries must separated using commas.')
             text = convertstr(map['output'])
             if isundefined(text):
@@ -406,6 +531,35 @@ def runtime_config():
             elif not isinstance(state, bool):
                 state = True
             result['crawl_officers'] = convertbool(state)
+            result['scrap_engine'] = convertstr(map['engine']).lower()
+            result['restapi_token'] = convertstr(map['token'])
+            result['restapi_enable'] = not isundefined(result['restapi_token'])
+            result['scrap_concurrency'] = convertint(map['concurrency'])
+            result['match_threshold'] = convertfloat(map['match'])
+            result['scrap_rate'] = convertfloat(map['rate'])
+            result['metrics_port'] = convertint(map['metrics'])
+            result['crawl_incremental'] = convertbool(map['incremental'])
+            result['cache_enable'] = convertbool(map['cache'])
+            result['scrap_resume'] = convertbool(map['resume'])
+            result['output_stream'] = convertbool(map['stream'])
+            result['output_parquet'] = convertbool(map['parquet'])
+            result['scrap_profile'] = convertbool(map['profile'])
+            result['daemon_port'] = convertint(map['daemon'])
+            result['daemon_jobs'] = convertint(map['jobs'])
+            result['index_file'] = convertstr(map['index'])
+            result['index_source'] = convertstr(map['import'])
+            if not isundefined(result['index_source']) and isundefined(result['index_file']):
+                raise Exception('The "--import" argument needs the "--index" argument to define the path of the company index to build.')
+            num = map['processes']
+            if isundefined(num) or not isinstance(num, int) or num < 2:
+                result['scrap_processes'] = 0
+            else:
+                result['scrap_processes'] = num
+            num = map['hpages']
+            if isundefined(num) or not isinstance(num, int) or num < 1:
+                result['histories_pages'] = 0
+            else:
+                result['histories_pages'] = num
             return result
     paths = [os.path.abspath("settings.json"), os.path.abspath("setting.json"), os.path.abspath("config.json"), os.path.abspath("scrap.json"), os.path.abspath("scraper.json"), os.path.abspath("chscraper.json")]
     for path in paths:
@@ -419,7 +573,7 @@ def runtime_config():
                             return map
             except:
                 continue
-    return []
+    return {}
 
 def get_company_code(li, a):
     href = a.get_attribute("href")
@@ -470,31 +624,57 @@ def join_list(sequence, separator):
     return result
 
 class ThreadTask ( Thread ):
-    def __init__(self, target, query, node, tname):
-        Thread.__init__(self, target = target, name = "Thread-" + str(tname))
+    '''
+    Persistent worker thread that keeps pulling targets from a shared bounded queue until it receives
+    the None sentinel, and pushes every (position, result) pair to the results queue as soon as it is done.
+    '''
+
+    def __init__(self, target, query, tasks: Queue, results: Queue, tname):
+        Thread.__init__(self, target = target, name = "Thread-" + str(tname), daemon = True)
         self._tname = tname
         self._wname = query
-        self._node = node
-        self._return = None
-        self._is_done = False
+        self._tasks = tasks
+        self._results = results
+        self._count = 0
 
-    def is_ended(self):
-        return self._is_done == True and not self.isalive()
+    def get_count(self):
+        return self._count
+
+    def run(self):
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+            position, node = item
+            result = None
+            try:
+                result = self._target(self._wname, node, "Thread-" + str(self._tname))
+            except Exception as e:
+                label = node.get('name', '') if isinstance(node, dict) else node
+                print("> Thread-" + str(self._tname) + " => Failed to scrap \"" + str(label) + "\": " + str(e))
+            self._count += 1
+            self._results.put((position, result))
 
-    def has_result(self):
-        return not self._return is None
+class ProcessTask ( Process ):
+    '''
+    Worker process of the multi-process crawl mode, it builds its own provider with its own driver pool and
+    runs its worker threads against the shared task and result queues until they receive the None sentinel.
+    '''
 
-    def get_result(self):
-        return self._return
+    def __init__(self, settings: dict, tasks, results, pname, baseline = None):
+        Process.__init__(self, name = "Process-" + str(pname), daemon = True)
+        self._settings = settings
+        self._tasks = tasks
+        self._results = results
+        self._pname = pname
+        self._baseline = baseline
 
     def run(self):
-        if self._target is not None:
-            self._return = self._target(self._wname, self._node, "Thread-" + str(self._tname))
-            self._is_done = True
-
-    def join(self, *args):
-        Thread.join(self, *args)
-        return self._return
+        config = ScrapSettings()
+        config.imports(self._settings)
+        config.procs = 0
+        provider = ScrapProvider(config)
+        provider.serve(self._tasks, self._results, "Process-" + str(self._pname), self._baseline)
 
 class ScrapSettings:
     
@@ -506,6 +686,9 @@ class ScrapSettings:
         self.dvexec = ''
         self.dvaddr = ''
         self.dvlogs = ''
+        self.dvlean = False
+        self.dvblock = list(LEAN_BLOCKED)
+        self.dvnojs = []
         self.landing = 'https://beta.companieshouse.gov.uk'
         self.mrows = 20
         self.mpage = 5
@@ -515,6 +698,7 @@ class ScrapSettings:
         self.officer = True
         self.queries = convertlist(queries)
         self.exactly = True
+        self.mscore = 0.0
         text = convertstr(output)
         if not isundefined(text):
             if not os.path.isabs(text):
@@ -525,9 +709,34 @@ class ScrapSettings:
             self.output = os.path.abspath('output')
         self.useapi = False
         self.apikey = ''
+        self.apiurl = 'https://api.company-information.service.gov.uk'
+        self.apibudget = 600
+        self.engine = 'browser'
+        self.hpage = 0
+        self.increment = False
+        self.caching = False
+        self.cachedir = ''
+        self.cachemax = 1024
+        self.cachettl = dict(CACHE_TTLS)
+        self.resume = False
+        self.stream = False
+        self.parquet = False
+        self.procs = 0
+        self.concurrency = 100
+        self.rate = 5.0
+        self.ratemax = 20.0
+        self.mport = 0
+        self.profile = False
+        self.dport = 0
+        self.djobs = 2
+        self.indexdb = ''
+        self.indexcsv = ''
+
+    def reload(self, args = None):
 
-    def reload(self):
-        data = runtime_config()
+        self.imports(runtime_config(args))
+
+    def imports(self, data):
         self.dvargs = convertlist(data.get('driver_options', None))
         self.dvexcl = convertlist(data.get('driver_exclude', None))
         self.dvexts = convertlist(data.get('driver_extensions', None))
@@ -535,6 +744,9 @@ class ScrapSettings:
         self.dvexec = convertstr(data.get('driver_binary', None))
         self.dvaddr = convertstr(data.get('driver_address', None))
         self.dvlogs = convertstr(data.get('driver_logpath', None))
+        self.dvlean = convertbool(data.get('driver_lean', False))
+        self.dvblock = convertlist(data.get('driver_blocked', list(LEAN_BLOCKED)))
+        self.dvnojs = convertlist(data.get('driver_nojs', []))
         self.queries = convertlist(data.get('company_names', None))
         self.landing = convertstr(data.get('scrap_website', 'https://beta.companieshouse.gov.uk'))
         self.mrows = convertint(data.get('scrap_limits', 0))
@@ -545,8 +757,31 @@ class ScrapSettings:
         self.history = convertbool(data.get('crawl_histories', True))
         self.officer = convertbool(data.get('crawl_officers', True))
         self.exactly = convertbool(data.get('exact_matches', True))
+        self.mscore = convertfloat(data.get('match_threshold', 0.0))
         self.useapi = convertbool(data.get('restapi_enable', None))
         self.apikey = convertstr(data.get('restapi_token', None))
+        self.apiurl = convertstr(data.get('restapi_website', 'https://api.company-information.service.gov.uk'))
+        self.apibudget = convertint(data.get('restapi_budget', 600))
+        self.engine = convertstr(data.get('scrap_engine', 'browser')).lower()
+        self.hpage = convertint(data.get('histories_pages', 0))
+        self.increment = convertbool(data.get('crawl_incremental', False))
+        self.caching = convertbool(data.get('cache_enable', False))
+        self.cachedir = convertstr(data.get('cache_folder', ''))
+        self.cachemax = convertint(data.get('cache_limit', 1024))
+        self.cachettl = convertdict(data.get('cache_ttls', dict(CACHE_TTLS)))
+        self.resume = convertbool(data.get('scrap_resume', False))
+        self.stream = convertbool(data.get('output_stream', False))
+        self.parquet = convertbool(data.get('output_parquet', False))
+        self.procs = convertint(data.get('scrap_processes', 0))
+        self.concurrency = convertint(data.get('scrap_concurrency', 100))
+        self.rate = convertfloat(data.get('scrap_rate', 5.0))
+        self.ratemax = convertfloat(data.get('scrap_rate_max', 20.0))
+        self.mport = convertint(data.get('metrics_port', 0))
+        self.profile = convertbool(data.get('scrap_profile', False))
+        self.dport = convertint(data.get('daemon_port', 0))
+        self.djobs = convertint(data.get('daemon_jobs', 2))
+        self.indexdb = convertstr(data.get('index_file', ''))
+        self.indexcsv = convertstr(data.get('index_source', ''))
         
 
     def exports(self):
@@ -558,6 +793,9 @@ class ScrapSettings:
         map['driver_binary'] = self.dvexec
         map['driver_address'] = self.dvaddr
         map['driver_logpath'] = self.dvlogs
+        map['driver_lean'] = self.dvlean
+        map['driver_blocked'] = self.dvblock
+        map['driver_nojs'] = self.dvnojs
 
         map['company_names'] = self.queries
         map['scrap_website'] = self.landing
@@ -565,12 +803,35 @@ class ScrapSettings:
         map['scrap_parallel'] = self.thread
         map['scrap_logging'] = self.logging
         map['exact_matches'] = self.exactly
+        map['match_threshold'] = self.mscore
         map['maximum_pages'] = self.mpage
         map['output_folder'] = self.output
         map['crawl_histories'] = self.history
         map['crawl_officers'] = self.officer
         map['restapi_enable'] = self.useapi
         map['restapi_token'] = self.apikey
+        map['restapi_website'] = self.apiurl
+        map['restapi_budget'] = self.apibudget
+        map['scrap_engine'] = self.engine
+        map['histories_pages'] = self.hpage
+        map['crawl_incremental'] = self.increment
+        map['cache_enable'] = self.caching
+        map['cache_folder'] = self.cachedir
+        map['cache_limit'] = self.cachemax
+        map['cache_ttls'] = self.cachettl
+        map['scrap_resume'] = self.resume
+        map['output_stream'] = self.stream
+        map['output_parquet'] = self.parquet
+        map['scrap_processes'] = self.procs
+        map['scrap_concurrency'] = self.concurrency
+        map['scrap_rate'] = self.rate
+        map['scrap_rate_max'] = self.ratemax
+        map['metrics_port'] = self.mport
+        map['scrap_profile'] = self.profile
+        map['daemon_port'] = self.dport
+        map['daemon_jobs'] = self.djobs
+        map['index_file'] = self.indexdb
+        map['index_source'] = self.indexcsv
         return map
 
     def serialize(self):
@@ -585,6 +846,9 @@ class ScrapSettings:
         self.dvexec = ''
         self.dvaddr = ''
         self.dvlogs = ''
+        self.dvlean = False
+        self.dvblock = list(LEAN_BLOCKED)
+        self.dvnojs = []
         self.landing = 'https://beta.companieshouse.gov.uk'
         self.mrows = 20
         self.mpage = 5
@@ -593,11 +857,34 @@ class ScrapSettings:
         self.history = True
         self.officer = True
         self.exactly = True
+        self.mscore = 0.0
         if force:
             self.queries = []
             self.output = os.path.abspath('output')
         self.useapi = False
         self.apikey = ''
+        self.apiurl = 'https://api.company-information.service.gov.uk'
+        self.apibudget = 600
+        self.engine = 'browser'
+        self.hpage = 0
+        self.increment = False
+        self.caching = False
+        self.cachedir = ''
+        self.cachemax = 1024
+        self.cachettl = dict(CACHE_TTLS)
+        self.resume = False
+        self.stream = False
+        self.parquet = False
+        self.procs = 0
+        self.concurrency = 100
+        self.rate = 5.0
+        self.ratemax = 20.0
+        self.mport = 0
+        self.profile = False
+        self.dport = 0
+        self.djobs = 2
+        self.indexdb = ''
+        self.indexcsv = ''
 
     def prepare(self):
         if isundefined(self.output):
@@ -608,6 +895,11 @@ class ScrapSettings:
             self.dvargs = ["--disable-blink-features", "--disable-blink-features=AutomationControlled"]
         if isundefined(self.dvexcl):
             self.dvexcl = ["enable-automation", "enable-logging"]
+        if isundefined(self.dvblock):
+            self.dvblock = list(LEAN_BLOCKED)
+        if isundefined(self.dvnojs):
+            self.dvnojs = []
+        self.dvnojs = [convertstr(kind).lower() for kind in self.dvnojs]
         if isundefined(self.landing):
             self.dvexec = 'https://beta.companieshouse.gov.uk'
         if isundefined(self.mrows) or self.mrows < 0:
@@ -616,6 +908,45 @@ class ScrapSettings:
             self.mpage = 0
         if isundefined(self.thread) or self.thread < 1:
             self.thread = os.cpu_count()
+        if isundefined(self.hpage) or self.hpage < 0:
+            self.hpage = 0
+        if isundefined(self.procs) or self.procs < 0:
+            self.procs = 0
+        if isundefined(self.cachemax) or self.cachemax < 1:
+            self.cachemax = 1024
+        if isundefined(self.engine):
+            self.engine = 'browser'
+        if self.engine == 'browser' and (self.useapi or not isundefined(self.apikey)):
+            self.engine = 'api'
+        if not self.engine in ('browser', 'http', 'async', 'api'):
+            raise Exception('The scraper engine "' + self.engine + '" is not supported, please set "scrap_engine" with "browser", "http", "async" or "api".')
+        if self.engine == 'api' and isundefined(self.apikey):
+            raise Exception('The REST API engine needs an API key, please set it either from "--token" parameter in command line arguments or "restapi_token" in configuration file.')
+        if isundefined(self.apiurl):
+            self.apiurl = 'https://api.company-information.service.gov.uk'
+        if isundefined(self.apibudget) or self.apibudget < 1:
+            self.apibudget = 600
+        if isundefined(self.concurrency) or self.concurrency < 1:
+            self.concurrency = 100
+        if isundefined(self.rate) or self.rate < 0:
+            self.rate = 0.0
+        if isundefined(self.ratemax) or self.ratemax < self.rate:
+            self.ratemax = self.rate
+        if isundefined(self.mport) or self.mport < 0:
+            self.mport = 0
+        if isundefined(self.mscore) or self.mscore < 0:
+            self.mscore = 0.0
+        if self.mscore > 1:
+            raise Exception('The name matching score must be between 0 and 1, please check "match_threshold".')
+        if isundefined(self.djobs) or self.djobs < 1:
+            self.djobs = 2
+        if not isundefined(self.indexdb) and not os.path.isfile(self.indexdb) and isundefined(self.indexcsv):
+            raise Exception('The company index is not found at following path: "' + self.indexdb + '", please import the bulk company data first with "--import" parameter or "index_source" in configuration file.')
+        if self.parquet and importlib.util.find_spec('pyarrow') is None:
+            raise Exception('The Parquet output needs the "pyarrow" package, please install it with "pip install pyarrow" or set "output_parquet" with false.')
+        if self.engine == 'async' and self.procs > 1:
+            print('> The "async" engine runs in a single process, "scrap_processes" is ignored.')
+            self.procs = 0
         return self
 
     def cfgload(self, path):
@@ -639,6 +970,9 @@ class ScrapSettings:
             self.dvexec = convertstr(data.get('driver_binary', None))
             self.dvaddr = convertstr(data.get('driver_address', None))
             self.dvlogs = convertstr(data.get('driver_logpath', None))
+            self.dvlean = convertbool(data.get('driver_lean', False))
+            self.dvblock = convertlist(data.get('driver_blocked', list(LEAN_BLOCKED)))
+            self.dvnojs = convertlist(data.get('driver_nojs', []))
             self.queries = convertlist(data.get('company_names', None))
             self.landing = convertstr(data.get('scrap_website', 'https://beta.companieshouse.gov.uk'))
             self.mrows = convertint(data.get('scrap_limits', 0))
@@ -649,8 +983,31 @@ class ScrapSettings:
             self.history = convertbool(data.get('crawl_histories', True))
             self.officer = convertbool(data.get('crawl_officers', True))
             self.exactly = convertbool(data.get('exact_matches', False))
-            self.useapi = convertbool(data.get('api_enable', None))
-            self.apikey = convertstr(data.get('api_token', None))
+            self.mscore = convertfloat(data.get('match_threshold', 0.0))
+            self.useapi = convertbool(data.get('restapi_enable', None))
+            self.apikey = convertstr(data.get('restapi_token', None))
+            self.apiurl = convertstr(data.get('restapi_website', 'https://api.company-information.service.gov.uk'))
+            self.apibudget = convertint(data.get('restapi_budget', 600))
+            self.engine = convertstr(data.get('scrap_engine', 'browser')).lower()
+            self.hpage = convertint(data.get('histories_pages', 0))
+            self.increment = convertbool(data.get('crawl_incremental', False))
+            self.caching = convertbool(data.get('cache_enable', False))
+            self.cachedir = convertstr(data.get('cache_folder', ''))
+            self.cachemax = convertint(data.get('cache_limit', 1024))
+            self.cachettl = convertdict(data.get('cache_ttls', dict(CACHE_TTLS)))
+            self.resume = convertbool(data.get('scrap_resume', False))
+            self.stream = convertbool(data.get('output_stream', False))
+            self.parquet = convertbool(data.get('output_parquet', False))
+            self.procs = convertint(data.get('scrap_processes', 0))
+            self.concurrency = convertint(data.get('scrap_concurrency', 100))
+            self.rate = convertfloat(data.get('scrap_rate', 5.0))
+            self.ratemax = convertfloat(data.get('scrap_rate_max', 20.0))
+            self.mport = convertint(data.get('metrics_port', 0))
+            self.profile = convertbool(data.get('scrap_profile', False))
+            self.dport = convertint(data.get('daemon_port', 0))
+            self.djobs = convertint(data.get('daemon_jobs', 2))
+            self.indexdb = convertstr(data.get('index_file', ''))
+            self.indexcsv = convertstr(data.get('index_source', ''))
         return True
 
     def cfgsave(self, path):
@@ -673,6 +1030,7 @@ class ScrapSettings:
         return path
 
     def options(self, chrome: bool = True):
+        from selenium import webdriver
         if chrome:
             opt = webdriver.ChromeOptions()
             if not isundefined(self.dvargs):
@@ -687,6 +1045,9 @@ class ScrapSettings:
                 opt.debugger_address = self.dvaddr
             if not isundefined(self.dvexec):
                 opt.binary_location = self.dvexec
+            if self.dvlean:
+                opt.set_capability("pageLoadStrategy", "eager")
+                opt.add_experimental_option("prefs", { "profile.managed_default_content_settings.images": 2 })
             opt.headless = self.dvhide
             return opt
         else:
@@ -700,6 +1061,7 @@ class ScrapSettings:
             return opt
     
     def chrome(self):
+        from selenium import webdriver
         opt = self.options(True)
         if not isundefined(self.dvlogs):
             driver = webdriver.Chrome(options=opt, service_log_path=self.dvlogs)
@@ -708,474 +1070,3737 @@ class ScrapSettings:
         driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", { "source": """Object.defineProperty(navigator, 'webdriver', { get: () => undefined }) """ }) 
         driver.execute_cdp_cmd("Network.enable", {})
         driver.execute_cdp_cmd("Network.setExtraHTTPHeaders", {"headers": {"User-Agent": "browser1"}})
+        if self.dvlean and not isundefined(self.dvblock):
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.dvblock})
         return driver
 
-    def firefox(self):
+    def scripting(self, driver, kind: str):
+        '''
+        Enable or disable JavaScript on a lean Chrome driver before it loads a page of the given kind,
+        server-rendered page kinds listed in "driver_nojs" are loaded with scripts disabled.
+        @param driver The Chrome web driver about to load the page
+        @param kind The page kind, one of "search", "company", "officers" or "filings"
+        '''
+        if not self.dvlean or not hasattr(driver, 'execute_cdp_cmd'):
+            return
+        disabled = kind in self.dvnojs
+        if getattr(driver, 'nojs', False) == disabled:
+            return
+        driver.execute_cdp_cmd("Emulation.setScriptExecutionDisabled", {"value": disabled})
+        driver.nojs = disabled
 
+    def firefox(self):
+        from selenium import webdriver
         return webdriver.Firefox(self.options(False))
 
-class ScrapProvider:
+class DriverPool:
+    '''
+    Keeps a bounded set of live web drivers which are started once per run and shared by every task.
+    Drivers are checked out with acquire() and handed back with release(), which wipes the browser state
+    so the next task starts from a clean session without paying another browser cold start.
+    '''
 
-    def __init__(self, config: ScrapSettings):
-        if config is None:
-            config = ScrapSettings()
-            config.reload()
-        config.prepare()
-        self.config = config
+    def __init__(self, config, size: int, factory = None):
+        self._config = config
+        self._size = maxval(int(size), 1)
+        self._factory = factory if not factory is None else config.chrome
+        self._idle = []
+        self._live = 0
+        self._lock = Lock()
+        self._ready = Condition(self._lock)
+        self._drivers = []
+        self._attached = []
+        self.metrics = None
+        self.client = None
 
-    def __scrapPage(self, driver, query: str):
-        first = time.time()
-        driver.get(self.config.landing.rstrip("/") + "/search/companies?q=" + urllib.parse.quote(query))
-        expect = 10000
-        matches = -1
-        smeta = find_element_by_id(driver, 'search-meta')
-        if not smeta is None:
-            para = find_element_by_tag_name(smeta, 'p')
-            if not para is None:
-                ptext = para.text.strip()
-                ptext = ptext.replace('matches found', "").strip()
-                ptext = ptext.replace(",", "")
-                if not isundefined(ptext):
-                    try:
-                        matches = int(expect)
-                        expect = 0 if matches == 0 else int(round(matches / 20, 0))
-                    except: expect = 10000
-        mrows = self.config.mrows
-        mpage = self.config.mpage
-        paging = expect if mpage < 1 else minval(mpage, 10000)
-        if matches == -1:
-            print('> We could not found count of companies that available for query "' + query + '", we will run force mode with max pages = ' + str(paging) + ".")
-        elif matches == 0:
-            print('> The search with query "' + query + '" did not yield any results.')
-            return []
-        else:
-            print('> The search with query "' + query + '" has found ' + str(matches) + ' records with expected ' + str(paging) + " pages to scrap.")
-        result = []
-        count = 0
-        npage = 0
-        qlower = query.lower()
-        for number in range(0, paging, 1):
-            number += 1
-            if number > 1:
-                driver.get(self.config.landing.rstrip("/") + "/search/companies?q=" + urllib.parse.quote(query) + "&page=" + str(number))
-            ecode = find_element_by_id(driver, 'error-code')
-            if not ecode is None:
-                print("--- [Page " + str(number - 1) + "] 100% completed (no more pages are available)..")
-                break
-            prog = get_percent_flo(number, paging)
-            print("--- [Page " + str(number) + "] " + str(prog) + "% completed..")
-            npage = number
-            clusters = find_element_by_id(driver, 'results')
-            if clusters is None:
-                clusters = find_element_by_class_name(driver, 'results-list')
-                if not clusters:
-                    continue
-            litags = find_elements_by_tag_name(clusters, "li")
-            rows = 0
-            for li in litags:
-                anchor = find_element_by_tag_name(li, "a")
-                if not anchor is None:
-                    title = anchor.text.strip()
-                    if not self.config.exactly and title.lower().find(qlower) == -1:
-                        continue
-                    code = get_company_code(li, anchor)
-                    if code is None:
-                        continue
-                    if mrows > 0 and count + 1 > mrows:
-                        print("> Maximum records has reached.")
-                        break
-                    node = dict()
-                    node['page'] = number
-                    node['rows'] = rows
-                    node['index'] = count + 1
-                    node['code'] = code
-                    node['name'] = anchor.text.strip()
-                    node['href'] = anchor.get_attribute("href")
-                    print("------ [" + str(count).zfill(6) + " in page " + str(number).zfill(3) + " at row " + str(rows + 1).zfill(2) + "] " + title + " (" + code + ")")
-                    result.append(node)
-                    count += 1
-                    rows += 1
-            if rows == 0:
-                print("> Search terminated, no more records can be founded.")
-                break
-        e = int(time.time() - first)
-        print("> Finally, we've found " + str(len(result)) + ' records with query "' + query + '", elapsed time = ' + '{:02d}:{:02d}:{:02d}'.format(e // 3600, (e % 3600 // 60), e % 60))
-        return result
+    def attach(self, resource):
+        '''
+        Register a resource (another pool or a client) that must be closed together with this pool.
+        '''
+        self._attached.append(resource)
+        return resource
 
-    def __scrapUser(self, driver, target):
-        code = target['code']
-        driver.get("https://beta.companieshouse.gov.uk/company/" + code + "/officers")
-        container = find_element_by_class_name(driver, "appointments-list")
-        if container is None:
-            return []
-        sections = find_elements_by_tag_name(container, "div")
-        if sections is None or len(sections) < 1:
-            return []
-        index = 1
-        result = []
-        for div in sections:
-            cname = div.get_attribute("class")
-            if not cname is None and cname.startswith("appointment"):
-                oname = find_element_by_id(div, "officer-name-" + str(index))
-                oaddr = find_element_by_id(div, "officer-address-value-" + str(index))
-                orole = find_element_by_id(div, "officer-role-" + str(index))
-                ostat = find_element_by_id(div, "officer-status-tag-" + str(index))
-                obirth = find_element_by_id(div, "officer-date-of-birth-" + str(index))
-                oapdate = find_element_by_id(div, "officer-appointed-on-" + str(index))
-                onat = find_element_by_id(div, "officer-nationality-" + str(index))
-                oresi = find_element_by_id(div, "officer-country-of-residence-" + str(index))
-                oocu = find_element_by_id(div, "officer-occupation-" + str(index))
-                count = 0
-                data = {}
-                if not oname is None:
-                   data['name'] = oname.text.strip()
-                   count += 1
-                if not ostat is None:
-                    data['status'] = ostat.text.strip()
-                    count += 1
-                if not oaddr is None:
-                    data['address'] = oaddr.text.strip()
-                    count += 1
-                if not orole is None:
-                    data['role'] = orole.text.strip()
-                    count += 1
-                if not obirth is None:
-                    data['birth'] = obirth.text.strip()
-                    count += 1
-                if not onat is None:
-                    data['nationality'] = onat.text.strip()
-                    count += 1
-                if not oresi is None:
-                    data['residence'] = oresi.text.strip()
-                    count += 1
-                if not oocu is None:
-                    data['occupation'] = oocu.text.strip()
-                    count += 1
-                if not oapdate is None:
-                    if not ostat is None and ostat.text.strip().lower() == 'resigned':
-                        data['resigned'] = oapdate.text.strip()
-                    else:
-                        data['appointed'] = oapdate.text.strip()
-                    count += 1
-                if count > 0:
-                    result.append(data)
-                index += 1
-        return result
+    def acquire(self):
+        '''
+        Check out an idle driver, or start a new one while the pool has a free slot, otherwise wait until a
+        driver is released or a slot is freed by discard().
+        '''
+        with self._ready:
+            while True:
+                if len(self._idle) > 0:
+                    return self._idle.pop()
+                if self._live < self._size:
+                    self._live += 1
+                    break
+                self._ready.wait()
+        return self.__spawn()
 
-    def __scrapHist(self, driver, target):
-        code = target['code']
-        driver.get("https://beta.companieshouse.gov.uk/company/" + code + "/filing-history")
-        container = find_element_by_id(driver, "filing-history-content")
-        if container is None:
-            return []
-        table = find_element_by_id(container, "fhTable")
-        if table is None:
-            table = find_element_by_tag_name(container, "table")
-            if table is None:
-                return []
-        output = []
-        rows = find_elements_by_tag_name(table, "tr")
-        index = 1
-        for row in rows:
-            th = find_element_by_tag_name(row, "th")
-            if th is None:
-                tdlist = find_elements_by_tag_name(row, "td")
-                if not tdlist is None and len(tdlist) > 2:
-                    data = { "no": index , "date": tdlist[0].text.strip() }
-                    offset = 1
-                    tdnext = tdlist[offset]
-                    tdclass = tdnext.get_attribute("class")
-                    if not tdclass is None and tdclass.find("js-hidden") != -1:
-                        tdnext = tdlist[2]
-                        offset = 2
-                    data["desc"] = tdnext.text.strip()
-                    tdnext = tdlist[offset + 1]
-                    if not tdnext is None:
-                        a = find_element_by_tag_name(tdnext, "a")
-                        if not a is None:
-                            data["docs"] = a.get_attribute("href")
-                    index += 1
-                    output.append(data)
-        return output
+    def __spawn(self):
+        try:
+            started = time.perf_counter()
+            driver = self._factory()
+            if not self.metrics is None:
+                self.metrics.observe('driver_start', time.perf_counter() - started, 'http' if isinstance(driver, HttpDriver) else 'browser')
+        except:
+            with self._ready:
+                self._live -= 1
+                self._ready.notify()
+            raise
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
 
-    def __scrapView(self, driver, target):
-        container = find_element_by_id(driver, "content-container")
-        if container is None: 
-            return {}
-        array = {}
-        cpstat = find_element_by_id(driver, "company-status")
-        csdate = find_element_by_id(driver, "cessation-date")
-        cptype = find_element_by_id(driver, "company-type")
-        cpcrdt = find_element_by_id(driver, "company-creation-date")
-        array['name'] = target['name']
-        dlList = find_elements_by_tag_name(container, "dl")
-        if not dlList is None:
-            found = False
-            for dl in dlList:
-                if found:
-                    break
-                dt = dl.find_element_by_tag_name("dt")
-                if not dt is None and dt.text.strip().lower().find("address") != -1:
-                    dd = find_element_by_tag_name(dl, "dd")
-                    if not dd is None:
-                        array['address'] = dd.text.strip()
-                        found = True
-        if not cpstat is None:
-            array['status'] = cpstat.text.strip()
-        if not cptype is None:
-            array['type'] = cptype.text.strip()
-        if not csdate is None:
-            array['dissolved'] = csdate.text.strip()
-        if not cpcrdt is None:
-            array['incorporated'] = cpcrdt.text.strip()
-        return array
+    def release(self, driver):
+        if driver is None:
+            return
+        try:
+            self.reset(driver)
+        except:
+            self.discard(driver)
+            return
+        with self._ready:
+            self._idle.append(driver)
+            self._ready.notify()
 
-    def __scrapMain(self, driver, target, tname):
-        code = target['code']
-        driver.get(self.config.landing.strip("/") + "/company/" + code)
-        enode = find_element_by_id(driver, 'page-not-found-header')
-        if not enode is None: 
-            print('> The company with code "' + code + '" is not found..')
-            return None
-        result = { 'number': target['index'], 'paging': target['page'], "company": target['name'], 'identity': target['code'], 'profile': target['href'] }
-        print("> " + tname + " => Scraping company overview information (" + target['name'] + ").")
-        result['overview'] = self.__scrapView(driver, target)
-        if self.config.history:
-            print("> " + tname + " => Scraping company history information (" + target['name'] + ").")
-            result['histories'] = self.__scrapHist(driver, target)            
-        if self.config.officer:
-            print("> " + tname + " => Scraping company officers information (" + target['name'] + ").")
-            result['officers'] = self.__scrapUser(driver, target)
-        return result
+    def reset(self, driver):
+        if isinstance(driver, HttpDriver):
+            driver.reset()
+            return
+        handles = driver.window_handles
+        if len(handles) > 1:
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        self._config.scripting(driver, None)
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except:
+            pass
+        driver.get("about:blank")
 
-    def __scrapTask(self, query, target, tname):
-        print("> " + tname + " => Scraping information about \"" + target['name'] + "\".")
-        driver = self.config.chrome()
+    def discard(self, driver):
+        '''
+        Quit the broken driver and free its slot, a thread waiting in acquire() is woken to start a new
+        driver instead of waiting for a release that never comes.
+        '''
+        with self._ready:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+            self._live -= 1
+            self._ready.notify()
         try:
-            return self.__scrapMain(driver, target, tname)
-        finally:
-            driver.close()
             driver.quit()
+        except:
+            pass
 
-    def __scrapNode(self, query: str):
-        driver = self.config.chrome()
-        targets = self.__scrapPage(driver, query)
-        driver.close()
-        driver.quit()
-        array = dict()
-        header = dict()
-        header['keywords'] = query
-        header['datetime'] = datetime.datetime.now().isoformat()
-        header['companies'] = 0
-        header['elapsed'] = '00:00:00'
-        if len(targets) == 0:
-            array['header'] = header
-            return array
-        mtask = self.config.thread
-        if mtask < 1: mtask = os.cpu_count()
-        results = []
-        if mtask == 1:
-            for target in targets:
-                res = self.__scrapTask(query, target, "Thread-1")
-                if not res is None:
-                    results.append(res)
-            array['header'] = header
-            array['matches'] = results
-            return array
-        else:
-            workers = []
-            count = 0
-            print("> Maximum thread queue is: " + str(mtask))
-            for target in targets:
-                avail = len(workers)
-                print("> Available queue: " + str(avail))
-                if avail >= mtask:
-                    print("> Waiting queue, total: " + str(avail))
-                    while True:
-                        done = False
-                        for task in workers:
-                            done = task._is_done
-                            if not done: break
-                        if done: break
-                    for task in workers:
-                        res = task.get_result()
-                        if not res is None:
-                            results.append(res)
-                            count += 1
-                    workers.clear()
-                thread = ThreadTask(self.__scrapTask, query, target, len(workers) + 1)
-                workers.append(thread)
-                thread.start()
-            if len(workers) > 0:
-                while True:
-                    done = False
-                    for task in workers:
-                        done = task._is_done
-                        if not done: break
-                    if done: break
-                for task in workers:
-                    res = task.get_result()
-                    if not res is None:
-                        results.append(res)
-                        count += 1
-                    workers.clear()
-            header['companies'] = len(results)
-            array['header'] = header
-            array['matches'] = results
-            return array
+    def close(self):
+        with self._lock:
+            drivers = list(self._drivers)
+            self._drivers.clear()
+            self._idle.clear()
+            self._live = 0
+        for driver in drivers:
+            try:
+                driver.quit()
+            except:
+                pass
+        for resource in self._attached:
+            try:
+                resource.close()
+            except:
+                pass
+        self._attached.clear()
 
-    def dispatch(self):
-        first = time.time()
-        result = dict()
-        header = dict()
-        header['queries'] = self.config.queries
-        found = []
-        array = []
-        index = 1
-        for query in self.config.queries:
-            data = self.__scrapNode(query)
-            if not data is None and len(data) > 0:
-                matches = data.get('matches', None)
-                if not matches is None:
-                    for node in matches:
-                        node['number'] = index
-                        index += 1
-                    data['matches'] = matches
-                    array.append(data)
-                    found.append(len(matches))
-                else:
-                    found.append(0)
+class NoSuchElement(Exception):
+    '''
+    Raised by the parsed HTML elements when a lookup has no match, mirrors the webdriver behavior.
+    '''
+    pass
+
+HTML_VOID_TAGS = set(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'])
+HTML_BLOCK_TAGS = set(['address', 'article', 'aside', 'blockquote', 'caption', 'dd', 'details', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'summary', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul'])
+HTML_SKIP_TAGS = set(['script', 'style', 'template', 'noscript', 'head', 'title'])
+HTML_AUTO_CLOSE = {
+    'li': set(['li']),
+    'dt': set(['dt', 'dd']),
+    'dd': set(['dt', 'dd']),
+    'tr': set(['tr', 'td', 'th']),
+    'td': set(['td', 'th']),
+    'th': set(['td', 'th']),
+    'option': set(['option']),
+    'p': set(['p']),
+    'div': set(['p']),
+    'ul': set(['p']),
+    'ol': set(['p']),
+    'dl': set(['p']),
+    'table': set(['p']),
+    'h1': set(['p']), 'h2': set(['p']), 'h3': set(['p']), 'h4': set(['p']), 'h5': set(['p']), 'h6': set(['p']),
+}
+
+class HtmlElement:
+    '''
+    Lightweight parsed HTML element which exposes the subset of the webdriver element API used by the scraper,
+    so the scraping routines can run on either a live browser or a statically fetched page.
+    '''
+
+    __slots__ = ('tag', 'attrs', 'children', 'parent', 'root', '_ids', '_url')
+
+    def __init__(self, tag, attrs = None, parent = None):
+        self.tag = tag
+        self.attrs = attrs if not attrs is None else {}
+        self.children = []
+        self.parent = parent
+        self.root = self if parent is None else parent.root
+        self._ids = None
+        self._url = None
+
+    @property
+    def text(self):
+        '''
+        The rendered text of the element like the webdriver element text, the subtrees hidden with the "hidden"
+        attribute or an inline "display: none" / "visibility: hidden" style are left out. The visibility given by
+        stylesheet classes is not computed, so such text is still included.
+        '''
+        if self.hidden():
+            return ''
+        parts = []
+        self.__collect(self, parts)
+        lines = []
+        for line in ''.join(parts).split('\n'):
+            line = ' '.join(line.split())
+            if len(line) > 0:
+                lines.append(line)
+        return '\n'.join(lines)
+
+    @property
+    def tag_name(self):
+        return self.tag
+
+    def __collect(self, node, parts):
+        for child in node.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag in HTML_SKIP_TAGS or child.hidden():
+                continue
+            elif child.tag == 'br':
+                parts.append('\n')
+            elif child.tag in HTML_BLOCK_TAGS:
+                parts.append('\n')
+                self.__collect(child, parts)
+                parts.append('\n')
             else:
-                found.append(0)
-        e = int(time.time() - first)
-        header['elapsed'] = '{:02d}:{:02d}:{:02d}'.format(e // 3600, (e % 3600 // 60), e % 60)
-        header['matches'] = found
-        result['reports'] = header
-        result['results'] = array
-        jpath = self.__writeJson(result)
-        xpath = self.__writeExcel(result)
-        return [jpath, xpath]
+                self.__collect(child, parts)
 
-    def __writeJson(self, output):
-        folder = self.config.output
-        if not os.path.isabs(folder):
-            folder = os.path.abspath(folder)
-        path = os.path.join(folder, "results.json")
-        with open(path,'w') as file:
-            file.write(json.dumps(output, indent = 4))
-        return path
-    
-    def __writeExcel(self, output):
-        folder = self.config.output
-        if not os.path.isabs(folder):
-            folder = os.path.abspath(folder)
-        path = os.path.join(folder, "results.xlsx")
-        book = xlsxwriter.Workbook(path)
-        fmtinfo = book.add_format({'align': 'left', "bold": True, "border": 1})
-        fmttitl = book.add_format({'align': 'left', "bold": True, "border": 1, 'bg_color': '#DDDDDD'})
-        fmtkey = book.add_format({'align': 'left', "bold": False, "border": 1})
-        fmttbl = book.add_format({'align': 'center', "bold": True, "border": 1, 'bg_color': '#DDDDDD'})
-        fmtcpy = book.add_format({'align': 'left', "bold": True, "border": 1, 'bg_color': '#D98AF8'})
-        fmtsec = book.add_format({'align': 'left', "bold": False, "border": 1, 'bg_color': '#66D248', 'font_size': 14})
-        sheet = book.add_worksheet("Scrap Results")
-        
-        sheet.write_string("A1", "Overview", fmttbl)
-        sheet.write_string("A2", "Name", fmttitl)
-        sheet.write_string("B2", "Data", fmttitl)
-        sheet.merge_range("A1:B1", "Overview", fmttbl)
-
-        sheet.write_string("C1", "Officers", fmttbl)
-        sheet.write_string("C2", "Number", fmttitl)
-        sheet.write_string("D2", "Name", fmttitl)
-        sheet.write_string("E2", "Status", fmttitl)
-        sheet.write_string("F2", "Occupation", fmttitl)
-        sheet.write_string("G2", "Role", fmttitl)
-        sheet.write_string("H2", "Birth Date", fmttitl)
-        sheet.write_string("I2", "Nationality", fmttitl)
-        sheet.write_string("J2", "Address", fmttitl)
-        sheet.write_string("K2", "Residence", fmttitl)
-        sheet.write_string("L2", "Appointed/Resign", fmttitl)
-        sheet.merge_range("C1:L1", "Officers", fmttbl)
-
-        sheet.write_string("M1", "Histories", fmttbl)
-        sheet.write_string("M2", "Number", fmttitl)
-        sheet.write_string("N2", "Date", fmttitl)
-        sheet.write_string("O2", "Info", fmttitl)
-        sheet.write_string("P2", "URL", fmttitl)
-        sheet.merge_range("N1:P1", "Histories", fmttbl)
-        sheet.set_column(0, 20, 18)
-        index = 3
-        array = output['results']
-        for node in array:
-            pos = str(index)
-            title = str(node['header']['companies']) + " companies found for \"" + node['header']['keywords'] + "\""
-            sheet.write_string("A" + pos, title, fmtsec)
-            sheet.merge_range("A" + pos + ":" + "P" + pos, title, fmtsec)
-            index += 1
-            data = node['matches']
-            for record in data:
-                pos = str(index)
-                title = "[" + str(record['number']) + "] " + record['company'] + " (" + record['identity'] + ")"
-                sheet.write_string("A" + pos, title, fmtcpy)
-                sheet.merge_range("A" + pos + ":" + "P" + pos, title, fmtcpy)
-                index += 1
-                pos = str(index)
-                over = record['overview']
-                sheet.write_string("A" + pos, "Address", fmtinfo)
-                sheet.write_string("B" + pos, over['address'], fmtinfo)
-                pos = str(index + 1)
-                sheet.write_string("A" + pos, "Status", fmtinfo)
-                sheet.write_string("B" + pos, over['status'], fmtinfo)
-                pos = str(index + 2)
-                sheet.write_string("A" + pos, "Type", fmtinfo)
-                sheet.write_string("B" + pos, over['type'], fmtinfo)
-                pos = str(index + 3)
-                sheet.write_string("A" + pos, "Incorporated", fmtinfo)
-                sheet.write_string("B" + pos, over['incorporated'], fmtinfo)
-                pos = str(index)
-                hgover = 4
-                hghist = 0
-                hgoffc = 0
-                users = record.get('officers', None)
-                if not users is None:
-                    for user in users:
-                        sheet.write_string("C" + pos, str(hgoffc + 1), fmtinfo)
-                        sheet.write_string("D" + pos, user.get('name', '-'), fmtinfo)
-                        sheet.write_string("E" + pos, user.get('status', '-'), fmtinfo)
-                        sheet.write_string("F" + pos, user.get('occupation', '-'), fmtinfo)
-                        sheet.write_string("G" + pos, user.get('role', '-'), fmtinfo)
-                        sheet.write_string("H" + pos, user.get('birth', '-'), fmtinfo)
-                        sheet.write_string("I" + pos, user.get('nationality', '-'), fmtinfo)
-                        sheet.write_string("J" + pos, user.get('address', '-'), fmtinfo)
-                        sheet.write_string("K" + pos, user.get('residence', '-'), fmtinfo)
-                        sheet.write_string("L" + pos, user.get('appointed', user.get('resigned', '-')), fmtinfo)
-                        hgoffc += 1
-                        pos = str(index + hgoffc)
-                hist = record.get('histories', None)
-                if not hist is None:
-                    for info in hist:
-                        sheet.write_string("M" + pos, str(info.get('no', '-')), fmtinfo)
-                        sheet.write_string("N" + pos, info.get('date', '-'), fmtinfo)
-                        sheet.write_string("O" + pos, info.get('desc', '-'), fmtinfo)
-                        sheet.write_string("P" + pos, info.get('docs', '-'), fmtinfo)
-                        hghist += 1
-                        pos = str(index + hghist)
-                index += max([hghist, hgoffc, hghist])        
-        book.close()
-        return path
+    def hidden(self):
+        if 'hidden' in self.attrs:
+            return True
+        style = self.attrs.get('style', None)
+        if isundefined(style):
+            return False
+        style = ''.join(style.lower().split())
+        return 'display:none' in style or 'visibility:hidden' in style
+
+    def get_attribute(self, name):
+        value = self.attrs.get(name, None)
+        if not value is None and name in ('href', 'src', 'action'):
+            base = self.root._url
+            if not isundefined(base):
+                return urllib.parse.urljoin(base, value)
+        return value
+
+    def contains(self, node):
+        while not node is None:
+            if node is self:
+                return True
+            node = node.parent
+        return False
+
+    def iterate(self):
+        stack = list(reversed(self.children))
+        while len(stack) > 0:
+            node = stack.pop()
+            if isinstance(node, str):
+                continue
+            yield node
+            stack.extend(reversed(node.children))
+
+    def has_class(self, cname):
+        value = self.attrs.get('class', None)
+        if isundefined(value):
+            return False
+        return cname in value.split()
+
+    def find_elements_by_id(self, id):
+        nodes = self.root._ids.get(id, []) if not self.root._ids is None else []
+        return [node for node in nodes if node is not self and self.contains(node)]
+
+    def find_element_by_id(self, id):
+        nodes = self.find_elements_by_id(id)
+        if len(nodes) < 1:
+            raise NoSuchElement('Element with ID "' + str(id) + '" is not found.')
+        return nodes[0]
+
+    def find_elements_by_tag_name(self, name):
+        name = name.lower()
+        return [node for node in self.iterate() if node.tag == name]
+
+    def find_element_by_tag_name(self, name):
+        name = name.lower()
+        for node in self.iterate():
+            if node.tag == name:
+                return node
+        raise NoSuchElement('Element with tag "' + str(name) + '" is not found.')
+
+    def find_elements_by_class_name(self, cname):
+        return [node for node in self.iterate() if node.has_class(cname)]
+
+    def find_element_by_class_name(self, cname):
+        for node in self.iterate():
+            if node.has_class(cname):
+                return node
+        raise NoSuchElement('Element with class "' + str(cname) + '" is not found.')
+
+class HtmlBuilder(HTMLParser):
+    '''
+    Tolerant HTML tree builder on top of the standard library parser, handles void elements
+    and the implicitly closed tags (li, td, tr, dt, dd, p) that server rendered pages rely on.
+    '''
+
+    def __init__(self, url = None):
+        HTMLParser.__init__(self, convert_charrefs = True)
+        self.root = HtmlElement('#document')
+        self.root._ids = dict()
+        self.root._url = url
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        closes = HTML_AUTO_CLOSE.get(tag, None)
+        if not closes is None:
+            while len(self._stack) > 1 and self._stack[-1].tag in closes:
+                self._stack.pop()
+        data = dict()
+        for key, value in attrs:
+            data[key] = value if not value is None else ''
+        node = HtmlElement(tag, data, self._stack[-1])
+        self._stack[-1].children.append(node)
+        nid = data.get('id', None)
+        if not isundefined(nid):
+            self.root._ids.setdefault(nid, []).append(node)
+        if not tag in HTML_VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if not tag in HTML_VOID_TAGS and self._stack[-1].tag == tag:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        for position in range(len(self._stack) - 1, 0, -1):
+            if self._stack[position].tag == tag:
+                del self._stack[position:]
+                return
+
+    def handle_data(self, data):
+        self._stack[-1].children.append(data)
+
+def parse_html(source, url = None):
+    '''
+    Parse the given HTML source into a tree of HtmlElement and returns the document root element.
+    @source The HTML source text
+    @url The address of the page, used to resolve relative hyperlinks
+    '''
+    builder = HtmlBuilder(url)
+    builder.feed(source if not source is None else '')
+    builder.close()
+    return builder.root
+
+def requires_script(root):
+    '''
+    Determines whether the parsed page can only be read after running its scripts, that is a page
+    without any visible body content or a script challenge that redirects through a noscript refresh.
+    '''
+    body = find_element_by_tag_name(root, 'body')
+    if body is None:
+        return True
+    for noscript in root.find_elements_by_tag_name('noscript'):
+        for meta in noscript.find_elements_by_tag_name('meta'):
+            if convertstr(meta.attrs.get('http-equiv', None)).lower() == 'refresh':
+                return True
+    if len(body.text) > 0:
+        return False
+    return len(body.find_elements_by_tag_name('script')) > 0
+
+class HttpResponse:
+
+    def __init__(self, status, headers, body, url):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    def charset(self):
+        ctype = self.headers.get('content-type', '')
+        for part in ctype.split(';'):
+            part = part.strip()
+            if part.lower().startswith('charset='):
+                return part[8:].strip('"\' ')
+        return 'utf-8'
+
+    def text(self):
+        try:
+            return self.body.decode(self.charset(), 'replace')
+        except LookupError:
+            return self.body.decode('utf-8', 'replace')
+
+    def is_html(self):
+        ctype = self.headers.get('content-type', '').lower()
+        return len(ctype) < 1 or ctype.find('html') != -1
+
+class HttpClient:
+    '''
+    Thread safe HTTP client which keeps idle keep-alive connections per host and reuses them across requests.
+    '''
+
+    def __init__(self, size: int = 8, timeout: float = 30, agent: str = None):
+        self._size = maxval(int(size), 1)
+        self._timeout = timeout
+        self._agent = agent if not isundefined(agent) else 'Mozilla/5.0 (compatible; chscraper)'
+        self._idle = dict()
+        self._lock = Lock()
+
+    def __checkout(self, key):
+        with self._lock:
+            conns = self._idle.get(key, None)
+            if not conns is None and len(conns) > 0:
+                return conns.pop(), True
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout = self._timeout), False
+        return http.client.HTTPConnection(host, port, timeout = self._timeout), False
+
+    def __checkin(self, key, conn):
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self._size:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def request(self, url, method = 'GET', headers = None, body = None, redirects = 5):
+        '''
+        Send the request through a pooled connection and returns HttpResponse, redirects are followed.
+        @url The absolute address to request
+        @headers Optional dictionary of extra request headers
+        '''
+        for hop in range(0, redirects + 1, 1):
+            parts = urllib.parse.urlsplit(url)
+            scheme = parts.scheme.lower() if not isundefined(parts.scheme) else 'http'
+            key = (scheme, parts.hostname, parts.port)
+            path = parts.path if not isundefined(parts.path) else '/'
+            if not isundefined(parts.query):
+                path += '?' + parts.query
+            send = { 'User-Agent': self._agent, 'Accept': 'text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8', 'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive' }
+            if not headers is None:
+                send.update(headers)
+            for attempt in range(0, 2, 1):
+                conn, reused = self.__checkout(key)
+                try:
+                    conn.request(method, path, body = body, headers = send)
+                    response = conn.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    if not reused or attempt > 0:
+                        raise
+                except:
+                    conn.close()
+                    raise
+            rheaders = dict()
+            for name, value in response.getheaders():
+                rheaders[name.lower()] = value
+            if response.will_close:
+                conn.close()
+            else:
+                self.__checkin(key, conn)
+            location = rheaders.get('location', None)
+            if response.status in (301, 302, 303, 307, 308) and not isundefined(location) and hop < redirects:
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303:
+                    method = 'GET'
+                    body = None
+                continue
+            encoding = rheaders.get('content-encoding', '').lower()
+            if encoding == 'gzip':
+                data = gzip.decompress(data)
+            elif encoding == 'deflate':
+                data = zlib.decompress(data)
+            return HttpResponse(response.status, rheaders, data, url)
+        raise Exception('Too many redirects while requesting "' + url + '".')
+
+    def close(self):
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle.clear()
+        for conns in pools:
+            for conn in conns:
+                conn.close()
+
+class HttpDriver:
+    '''
+    Webdriver look-alike that loads pages over HttpClient and parses them locally, pages that only
+    render with scripts enabled are loaded again through a browser checked out from the fallback pool.
+    '''
+
+    def __init__(self, client: HttpClient, fallback = None):
+        self._client = client
+        self._fallback = fallback
+        self._browser = None
+        self._document = None
+        self._html = ''
+        self.status = 0
+        self.headers = {}
+        self.current_url = 'about:blank'
+
+    def get(self, url, headers = None):
+        self.reset()
+        response = None
+        try:
+            response = self._client.request(url, headers = headers)
+        except Exception as e:
+            if self._fallback is None:
+                raise
+            print('> HTTP engine failed to load "' + url + '" (' + str(e) + '), falling back to browser..')
+        if not response is None:
+            self.status = response.status
+            self.headers = response.headers
+            self.current_url = response.url
+            if response.status == 304:
+                self._document = parse_html('', response.url)
+                return
+            self._html = response.text() if response.is_html() else ''
+            self._document = parse_html(self._html, response.url)
+            if self._fallback is None:
+                return
+            if response.status == 429 or response.status >= 500:
+                return
+            if response.status in (200, 404, 410) and response.is_html() and not requires_script(self._document):
+                return
+        self._browser = self._fallback.acquire()
+        self._browser.get(url)
+        self._document = None
+        self._html = ''
+        self.status = 0
+        self.headers = {}
+        self.current_url = self._browser.current_url
+
+    def __source(self):
+        if not self._browser is None:
+            return self._browser
+        if self._document is None:
+            self._document = parse_html('', self.current_url)
+        return self._document
+
+    def snapshot(self):
+        if not self._browser is None:
+            return parse_html(self._browser.page_source, self._browser.current_url)
+        return self.__source()
+
+    @property
+    def page_source(self):
+        if not self._browser is None:
+            return self._browser.page_source
+        return self._html
+
+    def reset(self):
+        if not self._browser is None:
+            browser = self._browser
+            self._browser = None
+            self._fallback.release(browser)
+        self._document = None
+        self._html = ''
+        self.status = 0
+        self.headers = {}
+        self.current_url = 'about:blank'
+
+    def close(self):
+        self.reset()
+
+    def quit(self):
+        self.reset()
+
+class ScrapRecord:
+    '''
+    Base of the slotted result records, the fields are read and written like dictionary keys so the records pass
+    through the journal, the registry and the writers unchanged. A field set to None is missing and left out of the
+    output, and the text of the "INTERNED" fields is interned since the same values repeat over thousands of rows.
+    '''
+
+    __slots__ = ()
+    INTERNED = ()
+
+    def __init__(self, **values):
+        for key in self.__slots__:
+            setattr(self, key, None)
+        for key in values:
+            self[key] = values[key]
+
+    @classmethod
+    def imports(cls, data):
+        '''
+        Build a new record from the given dictionary or record, the keys that are not fields are ignored.
+        '''
+        if data is None:
+            return None
+        record = cls()
+        for key in data.keys():
+            if key in cls.__slots__:
+                record[key] = data[key]
+        return record
+
+    def __setitem__(self, key, value):
+        if not key in self.__slots__:
+            raise KeyError('The field "' + str(key) + '" is not defined in ' + type(self).__name__ + '.')
+        if key in self.INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.__slots__ and not getattr(self, key) is None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        return isinstance(other, ScrapRecord) and self.exports() == other.exports()
+
+    def __repr__(self):
+        return type(self).__name__ + repr(self.exports())
+
+    def get(self, key, default = None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def keys(self):
+        return [key for key in self.__slots__ if not getattr(self, key) is None]
 
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def exports(self):
+        '''
+        Returns the record as plain dictionaries and lists with the same layout as the JSON output.
+        '''
+        data = dict()
+        for key, value in self.items():
+            if isinstance(value, ScrapRecord):
+                value = value.exports()
+            elif isinstance(value, list):
+                value = [item.exports() if isinstance(item, ScrapRecord) else item for item in value]
+            data[key] = value
+        return data
+
+class OverviewRecord ( ScrapRecord ):
+    __slots__ = ('name', 'address', 'status', 'type', 'dissolved', 'incorporated')
+    INTERNED = ('status', 'type')
+
+class OfficerRecord ( ScrapRecord ):
+    __slots__ = ('name', 'status', 'address', 'role', 'birth', 'nationality', 'residence', 'occupation', 'appointed', 'resigned')
+    INTERNED = ('status', 'address', 'role', 'birth', 'nationality', 'residence', 'occupation', 'appointed', 'resigned')
+
+class FilingRecord ( ScrapRecord ):
+    __slots__ = ('no', 'date', 'desc', 'docs')
+    INTERNED = ('date',)
+
+class CompanyRecord ( ScrapRecord ):
+    __slots__ = ('number', 'paging', 'company', 'identity', 'profile', 'overview', 'histories', 'officers')
+
+    @classmethod
+    def imports(cls, data):
+        record = super().imports(data)
+        if record is None:
+            return None
+        record.overview = OverviewRecord.imports(record.overview)
+        if not record.histories is None:
+            record.histories = [FilingRecord.imports(item) for item in record.histories]
+        if not record.officers is None:
+            record.officers = [OfficerRecord.imports(item) for item in record.officers]
+        return record
+
+def record_json(value):
+    '''
+    JSON encoder fallback which writes the result records as the dictionaries of their set fields.
+    '''
+    if isinstance(value, ScrapRecord):
+        return dict(value.items())
+    raise TypeError('Object of type ' + type(value).__name__ + ' is not JSON serializable')
+
+def page_snapshot(driver):
+    '''
+    Take a parsed snapshot of the page loaded in the driver, the browser is asked for its page source
+    once and every field is then read locally from the returned HtmlElement tree without further round trips.
+    @driver Either webdriver engine or HttpDriver
+    '''
+    if isinstance(driver, HttpDriver):
+        return driver.snapshot()
+    return parse_html(driver.page_source, driver.current_url)
+
+def extract_matches(root):
+    '''
+    Read the number of matched companies from the search page snapshot, returns -1 when not available.
+    '''
+    smeta = find_element_by_id(root, 'search-meta')
+    if smeta is None:
+        return -1
+    para = find_element_by_tag_name(smeta, 'p')
+    if para is None:
+        return -1
+    ptext = para.text.strip()
+    ptext = ptext.replace('matches found', "").strip()
+    ptext = ptext.replace(",", "")
+    if isundefined(ptext):
+        return -1
+    try:
+        return int(ptext)
+    except:
+        return -1
+
+def extract_hits(root):
+    '''
+    Read the company hits from the search page snapshot, returns None when the page is an error page.
+    '''
+    ecode = find_element_by_id(root, 'error-code')
+    if not ecode is None:
+        return None
+    clusters = find_element_by_id(root, 'results')
+    if clusters is None:
+        clusters = find_element_by_class_name(root, 'results-list')
+        if clusters is None:
+            return []
+    hits = []
+    for li in clusters.find_elements_by_tag_name("li"):
+        anchor = find_element_by_tag_name(li, "a")
+        if not anchor is None:
+            code = get_company_code(li, anchor)
+            if code is None:
+                continue
+            hits.append({ 'title': anchor.text.strip(), 'code': code, 'href': anchor.get_attribute("href") })
+    return hits
+
+def extract_overview(root, name):
+    '''
+    Read the company overview fields from the company page snapshot.
+    '''
+    container = find_element_by_id(root, "content-container")
+    if container is None:
+        return OverviewRecord()
+    array = OverviewRecord()
+    cpstat = find_element_by_id(root, "company-status")
+    csdate = find_element_by_id(root, "cessation-date")
+    cptype = find_element_by_id(root, "company-type")
+    cpcrdt = find_element_by_id(root, "company-creation-date")
+    array['name'] = name
+    for dl in container.find_elements_by_tag_name("dl"):
+        dt = find_element_by_tag_name(dl, "dt")
+        if not dt is None and dt.text.strip().lower().find("address") != -1:
+            dd = find_element_by_tag_name(dl, "dd")
+            if not dd is None:
+                array['address'] = dd.text.strip()
+                break
+    if not cpstat is None:
+        array['status'] = cpstat.text.strip()
+    if not cptype is None:
+        array['type'] = cptype.text.strip()
+    if not csdate is None:
+        array['dissolved'] = csdate.text.strip()
+    if not cpcrdt is None:
+        array['incorporated'] = cpcrdt.text.strip()
+    return array
+
+def extract_officers(root):
+    '''
+    Read every appointment from the officers page snapshot.
+    '''
+    container = find_element_by_class_name(root, "appointments-list")
+    if container is None:
+        return []
+    index = 1
+    result = []
+    for div in container.find_elements_by_tag_name("div"):
+        cname = div.get_attribute("class")
+        if cname is None or not cname.startswith("appointment"):
+            continue
+        fields = [('name', "officer-name-"), ('status', "officer-status-tag-"), ('address', "officer-address-value-"), ('role', "officer-role-"), ('birth', "officer-date-of-birth-"), ('nationality', "officer-nationality-"), ('residence', "officer-country-of-residence-"), ('occupation', "officer-occupation-")]
+        data = OfficerRecord()
+        for key, prefix in fields:
+            node = find_element_by_id(div, prefix + str(index))
+            if not node is None:
+                data[key] = node.text.strip()
+        oapdate = find_element_by_id(div, "officer-appointed-on-" + str(index))
+        if not oapdate is None:
+            if data.get('status', '').lower() == 'resigned':
+                data['resigned'] = oapdate.text.strip()
+            else:
+                data['appointed'] = oapdate.text.strip()
+        if len(data) > 0:
+            result.append(data)
+        index += 1
+    return result
+
+def extract_next_page(root):
+    '''
+    Find the address of the next page from the pagination links of the page snapshot, returns None on the last page.
+    '''
+    anchor = find_element_by_id(root, 'next-page')
+    if anchor is None:
+        pagers = root.find_elements_by_class_name('pager') + root.find_elements_by_class_name('govuk-pagination')
+        for pager in pagers:
+            for node in pager.find_elements_by_tag_name('a'):
+                rel = convertstr(node.get_attribute('rel')).lower()
+                if rel == 'next' or node.text.strip().lower().startswith('next'):
+                    anchor = node
+                    break
+            if not anchor is None:
+                break
+    if anchor is None:
+        return None
+    href = anchor.get_attribute('href')
+    if isundefined(href):
+        return None
+    return href
+
+def filing_key(data):
+    '''
+    Build the identity of a filing history row, which is the transaction ID from its document link when
+    available or its date and description otherwise.
+    '''
+    docs = convertstr(data.get('docs', None))
+    if not isundefined(docs):
+        parts = docs.split('?')[0].split('/')
+        if 'filing-history' in parts:
+            pos = parts.index('filing-history')
+            if pos + 1 < len(parts) and not isundefined(parts[pos + 1]):
+                return parts[pos + 1]
+    return convertstr(data.get('date', None)) + '|' + convertstr(data.get('desc', None))
+
+def merge_histories(fresh, known):
+    '''
+    Merge the newly crawled filing history rows on top of the previously stored rows and renumber them.
+    @fresh The new rows, newest first
+    @known The rows from the previous run, newest first
+    '''
+    keys = set([filing_key(data) for data in fresh])
+    output = list(fresh)
+    for data in known:
+        if not filing_key(data) in keys:
+            output.append(FilingRecord.imports(data))
+    index = 1
+    for data in output:
+        data['no'] = index
+        index += 1
+    return output
+
+def extract_histories(root, index = 1):
+    '''
+    Read the filing history rows from the filing history page snapshot.
+    @index The number given to the first row
+    '''
+    container = find_element_by_id(root, "filing-history-content")
+    if container is None:
+        return []
+    table = find_element_by_id(container, "fhTable")
+    if table is None:
+        table = find_element_by_tag_name(container, "table")
+        if table is None:
+            return []
+    output = []
+    for row in table.find_elements_by_tag_name("tr"):
+        if not find_element_by_tag_name(row, "th") is None:
+            continue
+        tdlist = row.find_elements_by_tag_name("td")
+        if len(tdlist) > 2:
+            data = FilingRecord(no = index, date = tdlist[0].text.strip())
+            offset = 1
+            tdnext = tdlist[offset]
+            tdclass = tdnext.get_attribute("class")
+            if not tdclass is None and tdclass.find("js-hidden") != -1:
+                tdnext = tdlist[2]
+                offset = 2
+            data["desc"] = tdnext.text.strip()
+            if offset + 1 < len(tdlist):
+                a = find_element_by_tag_name(tdlist[offset + 1], "a")
+                if not a is None:
+                    data["docs"] = a.get_attribute("href")
+            index += 1
+            output.append(data)
+    return output
+
+def api_date(text, short: bool = False):
+    '''
+    Format an ISO date of the REST API the way the website prints it, such as "1 January 2000" or "1 Jan 2000".
+    @param text The date in "YYYY-MM-DD" format
+    @param short Set True to abbreviate the month name like the filing history pages
+    '''
+    text = convertstr(text)
+    if isundefined(text):
+        return ''
+    try:
+        date = datetime.date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+    return str(date.day) + " " + date.strftime('%b' if short else '%B') + " " + str(date.year)
+
+def api_address(data):
+    '''
+    Join the fields of a REST API address object into one line.
+    '''
+    if not isinstance(data, dict):
+        return ''
+    parts = []
+    for key in ('care_of', 'po_box', 'premises', 'address_line_1', 'address_line_2', 'locality', 'region', 'postal_code', 'country'):
+        text = convertstr(data.get(key, None)).strip()
+        if not isundefined(text):
+            parts.append(text)
+    return ", ".join(parts)
+
+def api_label(text):
+    text = convertstr(text).replace('-', ' ').strip()
+    return text[:1].upper() + text[1:]
+
+def api_overview(data, name):
+    '''
+    Map the company profile resource of the REST API to the fields read from the company page.
+    '''
+    array = OverviewRecord()
+    array['name'] = name
+    address = api_address(data.get('registered_office_address', None))
+    if not isundefined(address):
+        array['address'] = address
+    if 'company_status' in data:
+        array['status'] = api_label(data['company_status'])
+    if 'type' in data:
+        array['type'] = API_TYPES.get(data['type'], api_label(data['type']))
+    if 'date_of_cessation' in data:
+        array['dissolved'] = api_date(data['date_of_cessation'])
+    if 'date_of_creation' in data:
+        array['incorporated'] = api_date(data['date_of_creation'])
+    return array
+
+def api_officers(items):
+    '''
+    Map the officer list items of the REST API to the fields read from the officers page.
+    '''
+    result = []
+    for item in items:
+        data = OfficerRecord()
+        data['name'] = convertstr(item.get('name', None))
+        data['status'] = 'Resigned' if 'resigned_on' in item else ''
+        address = api_address(item.get('address', None))
+        if not isundefined(address):
+            data['address'] = address
+        if 'officer_role' in item:
+            data['role'] = api_label(item['officer_role'])
+        birth = item.get('date_of_birth', None)
+        if isinstance(birth, dict) and 'year' in birth:
+            month = convertint(birth.get('month', 0))
+            data['birth'] = (datetime.date(2000, month, 1).strftime('%B') + " " if month > 0 else "") + str(birth['year'])
+        for key, field in (('nationality', 'nationality'), ('residence', 'country_of_residence'), ('occupation', 'occupation')):
+            if field in item:
+                data[key] = convertstr(item[field])
+        if 'resigned_on' in item:
+            data['resigned'] = api_date(item['resigned_on'])
+        elif 'appointed_on' in item:
+            data['appointed'] = api_date(item['appointed_on'])
+        result.append(data)
+    return result
+
+def api_histories(items, landing: str, index = 1):
+    '''
+    Map the filing history items of the REST API to the rows read from the filing history pages, the
+    description is filled from the website template of its key in "API_DESCRIPTIONS", other keys are
+    humanized and followed by their values.
+    @landing The website address used to build the document links
+    @index The number given to the first row
+    '''
+    output = []
+    for item in items:
+        values = item.get('description_values', None)
+        values = values if isinstance(values, dict) else {}
+        desc = convertstr(values.get('description', None))
+        template = API_DESCRIPTIONS.get(convertstr(item.get('description', None)), None)
+        if isundefined(desc) and not template is None:
+            fields = dict()
+            for key in values:
+                value = convertstr(values[key])
+                fields[key] = api_date(value) if key.endswith('date') else value
+            try:
+                desc = template.format(**fields)
+            except KeyError:
+                desc = ''
+        if isundefined(desc):
+            desc = api_label(item.get('description', item.get('type', '')))
+            extra = []
+            for key in sorted(values):
+                value = convertstr(values[key])
+                extra.append(api_date(value) if key.endswith('date') else value)
+            if len(extra) > 0:
+                desc = desc + " " + ", ".join(extra)
+        data = FilingRecord(no = index, date = api_date(item.get('date', None), True), desc = desc)
+        links = item.get('links', None)
+        if isinstance(links, dict) and 'document_metadata' in links and 'self' in links:
+            data["docs"] = landing.rstrip("/") + links['self'] + "/document?format=pdf"
+        index += 1
+        output.append(data)
+    return output
+
+def is_throttled(root, status: int = 0):
+    '''
+    Tell whether a fetched page is a throttling or server error page instead of the requested content. HTTP
+    loads are judged by the status code alone, browser loads have no status so the page title must be one of
+    the error page titles exactly, the site suffix after " - " aside, so company names never match.
+    @param root The parsed page snapshot, may be None
+    @param status The HTTP status code when known, zero for browser loads
+    '''
+    if status > 0:
+        return status == 429 or status >= 500
+    node = find_element_by_tag_name(root, 'title')
+    if node is None:
+        return False
+    text = ' '.join(node.text.split()).lower()
+    return text.split(' - ')[0] in THROTTLE_TITLES
+
+def retry_after(headers):
+    '''
+    Read the delay in seconds of the "Retry-After" response header, returns None when missing or not a number.
+    '''
+    if isundefined(headers):
+        return None
+    for key in headers:
+        if key.lower() == 'retry-after':
+            try:
+                return maxval(float(headers[key]), 0.0)
+            except:
+                return None
+    return None
+
+class RateLimiter:
+    '''
+    Adaptive token bucket shared by every worker of a process, each page request reserves the next free
+    slot before it is sent. Throttled responses halve the rate and pause every worker for an exponential,
+    jittered backoff (or the "Retry-After" delay), successful responses then ramp the rate back up slowly.
+    '''
+
+    def __init__(self, rate: float, ceiling: float = 0.0, burst: int = 0):
+        self.rate = maxval(float(rate), 0.0)
+        self.ceiling = maxval(float(ceiling), self.rate)
+        self.floor = minval(0.5, self.rate)
+        self.step = self.rate / 50.0
+        self.burst = burst if burst > 0 else maxval(int(math.ceil(self.rate)), 1)
+        self.base = 1.0
+        self.cap = 60.0
+        self.throttles = 0
+        self._next = 0.0
+        self._until = 0.0
+        self._strikes = 0
+        self._lock = Lock()
+
+    def reserve(self):
+        '''
+        Reserve the next request slot and returns how many seconds the caller must wait before sending it.
+        '''
+        with self._lock:
+            now = time.monotonic()
+            slot = maxval(now, self._until)
+            if self.rate > 0:
+                slot = maxval(slot, maxval(self._next, now - (self.burst - 1) / self.rate))
+                self._next = slot + 1.0 / self.rate
+            return slot - now
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttled(self, after = None):
+        '''
+        Record a throttled response and pause every worker, returns the pause in seconds.
+        @param after The delay requested by the server through "Retry-After" if any
+        '''
+        with self._lock:
+            now = time.monotonic()
+            if now < self._until:
+                return self._until - now
+            self._strikes += 1
+            self.throttles += 1
+            if self.rate > 0:
+                self.rate = maxval(self.floor, self.rate * 0.5)
+            pause = after if not after is None else minval(self.cap, self.base * (2 ** (self._strikes - 1)))
+            pause = pause * (1.0 + random.random() * 0.5)
+            self._until = now + pause
+            return pause
+
+    def success(self):
+        with self._lock:
+            self._strikes = 0
+            if self.rate > 0 and self.rate < self.ceiling:
+                self.rate = minval(self.ceiling, self.rate + self.step)
+
+    def close(self):
+        if self.throttles > 0:
+            print("> Rate limiter: " + str(self.throttles) + " throttled responses, settled at " + str(round(self.rate, 2)) + " requests per second.")
+
+class ScrapMetrics:
+    '''
+    Thread-safe per-stage counters and latency histograms of a run, every sample is labelled with the stage,
+    the page kind, the query and the worker thread. The collected values are written as metrics.json next to
+    the results and can be served in Prometheus text format while the run is going on.
+    '''
+
+    def __init__(self):
+        self.query = ''
+        self.started = time.time()
+        self._stages = dict()
+        self._counters = dict()
+        self._local = threading.local()
+        self._lock = Lock()
+        self._server = None
+
+    def scope(self, query: str):
+        '''
+        Bind the query label to every sample recorded from the calling thread.
+        '''
+        self._local.query = query
+
+    def __labels(self, kind):
+        query = getattr(self._local, 'query', None)
+        if query is None:
+            query = self.query
+        return (kind or '', query or '', threading.current_thread().name)
+
+    def observe(self, stage: str, seconds: float, kind: str = None):
+        '''
+        Record one latency sample of the given stage.
+        @param stage The stage name, such as "driver_start", "navigation", "extraction" or "output"
+        @param seconds The duration of the sample in seconds
+        @param kind The page kind or the output format the sample belongs to
+        '''
+        key = (stage,) + self.__labels(kind)
+        with self._lock:
+            node = self._stages.get(key, None)
+            if node is None:
+                node = { 'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * (len(METRIC_BUCKETS) + 1) }
+                self._stages[key] = node
+            node['count'] += 1
+            node['sum'] += seconds
+            node['max'] = maxval(node['max'], seconds)
+            index = 0
+            while index < len(METRIC_BUCKETS) and seconds > METRIC_BUCKETS[index]:
+                index += 1
+            node['buckets'][index] += 1
+
+    def count(self, name: str, kind: str = None, value: int = 1):
+        key = (name,) + self.__labels(kind)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def merge(self, data: dict):
+        '''
+        Merge the exported metrics of another provider (a worker process) into this one.
+        '''
+        with self._lock:
+            for item in data.get('stages', []):
+                labels = item['labels']
+                key = (item['stage'], labels['kind'], labels['query'], labels['worker'])
+                node = self._stages.get(key, None)
+                if node is None:
+                    node = { 'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * (len(METRIC_BUCKETS) + 1) }
+                    self._stages[key] = node
+                node['count'] += item['count']
+                node['sum'] += item['sum']
+                node['max'] = maxval(node['max'], item['max'])
+                for index, value in enumerate(item['buckets']):
+                    node['buckets'][index] += value
+            for item in data.get('counters', []):
+                labels = item['labels']
+                key = (item['name'], labels['kind'], labels['query'], labels['worker'])
+                self._counters[key] = self._counters.get(key, 0) + item['value']
+
+    def exports(self):
+        stages = []
+        counters = []
+        summary = dict()
+        with self._lock:
+            for key in sorted(self._stages):
+                node = self._stages[key]
+                labels = { 'kind': key[1], 'query': key[2], 'worker': key[3] }
+                stages.append({ 'stage': key[0], 'labels': labels, 'count': node['count'], 'sum': round(node['sum'], 6), 'max': round(node['max'], 6), 'buckets': list(node['buckets']) })
+                total = summary.setdefault(key[0], { 'count': 0, 'sum': 0.0 })
+                total['count'] += node['count']
+                total['sum'] = round(total['sum'] + node['sum'], 6)
+            for key in sorted(self._counters):
+                labels = { 'kind': key[1], 'query': key[2], 'worker': key[3] }
+                counters.append({ 'name': key[0], 'labels': labels, 'value': self._counters[key] })
+        return { 'elapsed': round(time.time() - self.started, 3), 'bounds': METRIC_BUCKETS, 'summary': summary, 'stages': stages, 'counters': counters }
+
+    def prometheus(self):
+        '''
+        Render the metrics in the Prometheus text exposition format.
+        '''
+        data = self.exports()
+        lines = ['# TYPE chscraper_stage_seconds histogram']
+        for item in data['stages']:
+            labels = item['labels']
+            text = 'stage="' + item['stage'] + '",kind="' + labels['kind'] + '",query="' + labels['query'].replace('\\', '\\\\').replace('"', '\\"') + '",worker="' + labels['worker'] + '"'
+            total = 0
+            for index, bound in enumerate(METRIC_BUCKETS + ['+Inf']):
+                total += item['buckets'][index]
+                lines.append('chscraper_stage_seconds_bucket{' + text + ',le="' + str(bound) + '"} ' + str(total))
+            lines.append('chscraper_stage_seconds_sum{' + text + '} ' + str(item['sum']))
+            lines.append('chscraper_stage_seconds_count{' + text + '} ' + str(item['count']))
+        names = []
+        for item in data['counters']:
+            if not item['name'] in names:
+                names.append(item['name'])
+        for name in names:
+            lines.append('# TYPE chscraper_' + name + '_total counter')
+            for item in data['counters']:
+                if item['name'] != name:
+                    continue
+                labels = item['labels']
+                text = 'kind="' + labels['kind'] + '",query="' + labels['query'].replace('\\', '\\\\').replace('"', '\\"') + '",worker="' + labels['worker'] + '"'
+                lines.append('chscraper_' + name + '_total{' + text + '} ' + str(item['value']))
+        lines.append('# TYPE chscraper_elapsed_seconds gauge')
+        lines.append('chscraper_elapsed_seconds ' + str(data['elapsed']))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int):
+        '''
+        Serve the metrics at http://127.0.0.1:<port>/metrics from a background thread until close() is called.
+        '''
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.metrics = self
+        Thread(target = self._server.serve_forever, name = "Metrics", daemon = True).start()
+        print("> Serving metrics at http://127.0.0.1:" + str(port) + "/metrics")
+
+    def save(self, folder: str):
+        path = os.path.join(folder, "metrics.json")
+        with open(path, 'w') as file:
+            file.write(json.dumps(self.exports(), indent = 4))
+        return path
+
+    def close(self):
+        if not self._server is None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class MetricsHandler ( BaseHTTPRequestHandler ):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class ScrapProfiler:
+    '''
+    Profiles the crawl and output stages on the threads that run them, every thread records into its own
+    cProfile.Profile (a single shared one on Python 3.12 and later where profiling is process-wide) and a
+    sampling thread collects the stacks of the profiled threads for a flame graph. The per-thread profiles
+    are merged into one pstats file and the samples are written in the collapsed-stack format.
+    '''
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = dict()
+        self._shared = sys.version_info >= (3, 12)
+        self._profiles = []
+        self._running = 0
+        self._active = dict()
+        self._local = threading.local()
+        self._lock = Lock()
+        self._stop = Event()
+        self._sampler = Thread(target = self.__sample, name = "Profiler", daemon = True)
+        self._sampler.start()
+
+    def __profile(self):
+        if self._shared:
+            if len(self._profiles) == 0:
+                self._profiles.append(cProfile.Profile())
+            return self._profiles[0]
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = cProfile.Profile()
+            self._local.profile = profile
+            self._profiles.append(profile)
+        return profile
+
+    def run(self, stage: str, func, *args):
+        '''
+        Call the function under the profiler of the calling thread, nested calls are recorded by the outer stage.
+        @param stage The stage name heading the sampled stacks
+        @param func The function to call with the given arguments
+        '''
+        ident = threading.get_ident()
+        if ident in self._active:
+            return func(*args)
+        with self._lock:
+            profile = self.__profile()
+            self._active[ident] = stage
+            if not self._shared:
+                profile.enable()
+            elif self._running == 0:
+                profile.enable()
+            self._running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                if not self._shared:
+                    profile.disable()
+                elif self._running == 0:
+                    profile.disable()
+                self._active.pop(ident, None)
+
+    def __sample(self):
+        while not self._stop.wait(self.interval):
+            active = dict(self._active)
+            if len(active) == 0:
+                continue
+            frames = sys._current_frames()
+            for ident, stage in active.items():
+                frame = frames.get(ident, None)
+                stack = []
+                while not frame is None:
+                    code = frame.f_code
+                    stack.append(code.co_name + " (" + os.path.basename(code.co_filename) + ":" + str(code.co_firstlineno) + ")")
+                    frame = frame.f_back
+                if len(stack) == 0:
+                    continue
+                stack.append(stage)
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def stats(self):
+        with self._lock:
+            profiles = [profile for profile in self._profiles]
+        stats = None
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                continue
+        return stats
+
+    def merge(self, spath: str, cpath: str):
+        '''
+        Merge the pstats and collapsed-stack files of a worker process into this profiler.
+        '''
+        if os.path.isfile(spath):
+            profile = pstats.Stats(spath)
+            with self._lock:
+                self._profiles.append(profile)
+        if os.path.isfile(cpath):
+            with open(cpath, 'r') as file:
+                for line in file:
+                    key, _, count = line.rstrip('\n').rpartition(' ')
+                    if len(key) > 0:
+                        self.samples[key] = self.samples.get(key, 0) + int(count)
+
+    def save(self, spath: str, cpath: str):
+        '''
+        Write the merged profile to the pstats path and the samples to the collapsed-stack path.
+        '''
+        self.stop()
+        stats = self.stats()
+        if not stats is None:
+            stats.dump_stats(spath)
+        with open(cpath, 'w') as file:
+            for key in sorted(self.samples):
+                file.write(key + " " + str(self.samples[key]) + "\n")
+        return spath, cpath
+
+class PageCache:
+    '''
+    Persistent page cache keyed by URL, every entry keeps the page body together with its fetch time,
+    status and HTTP validators. Entries expire by page type TTL, missing companies and empty searches are
+    kept as negative entries, and the least recently used entries are evicted once the size limit is exceeded.
+    '''
+
+    def __init__(self, folder: str, limit: int, ttls: dict):
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        if not os.path.exists(folder):
+            os.makedirs(folder, 0o777, True)
+        self.folder = folder
+        self.limit = maxval(int(limit), 1) * 1024 * 1024
+        self.ttls = dict(CACHE_TTLS)
+        if not ttls is None:
+            for key in ttls:
+                self.ttls[key] = convertint(ttls[key])
+        self._lock = Lock()
+        self._index = dict()
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        for entry in os.scandir(folder):
+            if entry.is_file() and entry.name.endswith('.json.gz'):
+                stat = entry.stat()
+                self._index[entry.name[:-8]] = [stat.st_size, stat.st_mtime]
+                self._total += stat.st_size
+
+    def __path(self, key):
+        return os.path.join(self.folder, key + '.json.gz')
+
+    def key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def lookup(self, url):
+        '''
+        Find the cached entry of the given URL, returns None when not cached. The returned dictionary
+        has the "fresh" flag set when the entry is still within the TTL of its page type.
+        '''
+        key = self.key(url)
+        with self._lock:
+            if not key in self._index:
+                return None
+        path = self.__path(key)
+        try:
+            with gzip.open(path, 'rt', encoding = 'utf-8') as file:
+                entry = json.loads(file.read())
+        except:
+            self.__remove(key)
+            return None
+        if entry.get('url', None) != url:
+            return None
+        kind = 'missing' if entry.get('negative', False) else entry.get('kind', 'company')
+        ttl = self.ttls.get(kind, 0)
+        entry['fresh'] = ttl > 0 and time.time() - entry.get('fetched', 0) < ttl
+        self.__used(key)
+        return entry
+
+    def store(self, url, kind, body, status = 200, headers = None, negative = False):
+        headers = headers if not headers is None else {}
+        entry = dict()
+        entry['url'] = url
+        entry['kind'] = kind
+        entry['fetched'] = time.time()
+        entry['status'] = status
+        entry['negative'] = negative
+        entry['etag'] = headers.get('etag', None)
+        entry['modified'] = headers.get('last-modified', None)
+        entry['body'] = body
+        key = self.key(url)
+        path = self.__path(key)
+        temp = path + '.' + str(os.getpid()) + '.' + str(id(entry)) + '.tmp'
+        with gzip.open(temp, 'wt', encoding = 'utf-8') as file:
+            file.write(json.dumps(entry))
+        os.replace(temp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            prev = self._index.get(key, None)
+            if not prev is None:
+                self._total -= prev[0]
+            self._index[key] = [size, time.time()]
+            self._total += size
+        self.__evict()
+
+    def touch(self, entry, headers = None):
+        '''
+        Mark a revalidated entry as freshly fetched after the server answered with "304 Not Modified".
+        '''
+        headers = headers if not headers is None else {}
+        if not isundefined(headers.get('etag', None)):
+            entry['etag'] = headers.get('etag', None)
+        if not isundefined(headers.get('last-modified', None)):
+            entry['modified'] = headers.get('last-modified', None)
+        self.store(entry['url'], entry['kind'], entry['body'], entry.get('status', 200), { 'etag': entry.get('etag', None), 'last-modified': entry.get('modified', None) }, entry.get('negative', False))
+
+    def __used(self, key):
+        with self._lock:
+            node = self._index.get(key, None)
+            if not node is None:
+                node[1] = time.time()
+        try:
+            os.utime(self.__path(key))
+        except:
+            pass
+
+    def __remove(self, key):
+        with self._lock:
+            node = self._index.pop(key, None)
+            if not node is None:
+                self._total -= node[0]
+        try:
+            os.remove(self.__path(key))
+        except:
+            pass
+
+    def __evict(self):
+        with self._lock:
+            if self._total <= self.limit:
+                return
+            order = sorted(self._index.items(), key = lambda item: item[1][1])
+            target = int(self.limit * 0.9)
+            victims = []
+            total = self._total
+            for key, node in order:
+                if total <= target:
+                    break
+                victims.append(key)
+                total -= node[0]
+        for key in victims:
+            self.__remove(key)
+
+    def close(self):
+        print("> Page cache: " + str(self.hits) + " hits, " + str(self.revalidated) + " revalidated, " + str(self.misses) + " misses, " + str(round(self._total / 1048576.0, 2)) + " MB in use.")
+
+INDEX_COLUMNS = { 'name': 'CompanyName', 'code': 'CompanyNumber', 'status': 'CompanyStatus', 'category': 'CompanyCategory', 'incorporated': 'IncorporationDate', 'postcode': 'RegAddress.PostCode' }
+INDEX_BATCH = 20000
+INDEX_LIMIT = 200000
+
+def index_terms(text: str):
+    '''
+    Split the given company name or query into lower case search terms, every character that is not a letter or a digit
+    is treated as a separator.
+    @param text The company name or the query
+    '''
+    chars = [char if char.isalnum() else ' ' for char in convertstr(text).lower()]
+    return ''.join(chars).split()
+
+NAME_FORMS = [(['public', 'limited', 'company'], 'plc'), (['limited', 'liability', 'partnership'], 'llp'), (['limited', 'partnership'], 'lp'),
+    (['limited'], 'ltd'), (['cyfyngedig'], 'ltd'), (['company'], 'co'), (['corporation'], 'corp'), (['incorporated'], 'inc')]
+NAME_SKIPPED = set(['the', 'and', 'of', 'ltd', 'plc', 'llp', 'lp', 'co', 'corp', 'inc'])
+
+def normalize_name(text: str):
+    '''
+    Split the company name into search terms and rewrite the legal forms to their short form, such as
+    "Limited" to "ltd" and "Public Limited Company" to "plc".
+    @param text The company name or the query
+    '''
+    terms = index_terms(text)
+    output = []
+    pos = 0
+    while pos < len(terms):
+        for words, form in NAME_FORMS:
+            if terms[pos:pos + len(words)] == words:
+                output.append(form)
+                pos += len(words)
+                break
+        else:
+            output.append(terms[pos])
+            pos += 1
+    return output
+
+def stem_name(term: str):
+    '''
+    Reduce the plural search term to its singular form, such as "properties" to "property" and "services" to "service".
+    '''
+    if len(term) > 4 and term.endswith('ies'):
+        return term[:-3] + 'y'
+    if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+        return term[:-1]
+    return term
+
+def score_names(query: str, names):
+    '''
+    Score every company name against the query from 0 to 1, the legal forms and stop words are left out, plurals are
+    reduced to their singular form and a query term found as the start of a name term counts as a partial match. The score weights how much of the query is
+    found in the name twice as much as how much of the name is covered by the query.
+    @param query The search query
+    @param names The list of company names to score
+    '''
+    terms = [stem_name(term) for term in normalize_name(query) if not term in NAME_SKIPPED]
+    scores = []
+    for name in names:
+        words = [stem_name(word) for word in normalize_name(name) if not word in NAME_SKIPPED]
+        if len(terms) == 0:
+            scores.append(1.0)
+            continue
+        if len(words) == 0:
+            scores.append(0.0)
+            continue
+        unique = set(words)
+        matched = 0.0
+        for term in terms:
+            if term in unique:
+                matched += 1
+            elif any(word.startswith(term) for word in unique):
+                matched += 0.8
+        recall = matched / len(terms)
+        precision = minval(matched / len(words), 1.0)
+        scores.append(round((2 * recall + precision) / 3, 4))
+    return scores
+
+class CompanyIndex:
+    '''
+    Offline company index stored in SQLite with a FTS5 full-text table on the company names, it is built from the
+    Companies House "basic company data" snapshot and resolves the queries to company codes without the live search.
+    The snapshot is streamed in batches so the import memory does not grow with the file size.
+    '''
+
+    def __init__(self, path: str):
+        if not os.path.isabs(path):
+            path = os.path.abspath(path)
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+
+    def build(self, source: str):
+        '''
+        Import the bulk company data CSV file (or the zip file containing it) into a new index which replaces the
+        previous one once completed, returns the number of imported companies.
+        @param source The path to the snapshot file
+        '''
+        if not os.path.isfile(source):
+            raise Exception('The bulk company data file is not found at following path: "' + source + '".')
+        folder = os.path.dirname(self.path)
+        if not os.path.exists(folder):
+            os.makedirs(folder, 0o777, True)
+        temp = self.path + '.tmp'
+        if os.path.exists(temp):
+            os.remove(temp)
+        print('> Importing the bulk company data from "' + source + '" into the company index..')
+        first = time.time()
+        count = 0
+        conn = sqlite3.connect(temp)
+        try:
+            conn.execute('PRAGMA journal_mode = OFF')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute("CREATE VIRTUAL TABLE companies USING fts5(name, code UNINDEXED, status UNINDEXED, category UNINDEXED, incorporated UNINDEXED, postcode UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+            conn.execute('CREATE TABLE snapshot (source TEXT, imported TEXT, companies INTEGER)')
+            with self.__open(source) as file:
+                reader = csv.reader(file)
+                header = [name.strip() for name in next(reader, [])]
+                columns = []
+                for key in INDEX_COLUMNS:
+                    if not INDEX_COLUMNS[key] in header:
+                        raise Exception('The bulk company data file has no "' + INDEX_COLUMNS[key] + '" column.')
+                    columns.append(header.index(INDEX_COLUMNS[key]))
+                width = max(columns)
+                batch = []
+                for row in reader:
+                    if len(row) <= width:
+                        continue
+                    batch.append(tuple([row[column].strip() for column in columns]))
+                    if len(batch) >= INDEX_BATCH:
+                        conn.executemany('INSERT INTO companies VALUES (?, ?, ?, ?, ?, ?)', batch)
+                        conn.commit()
+                        count += len(batch)
+                        batch = []
+                        print("--- " + str(count) + " companies imported..")
+                if len(batch) > 0:
+                    conn.executemany('INSERT INTO companies VALUES (?, ?, ?, ?, ?, ?)', batch)
+                    count += len(batch)
+            conn.execute("INSERT INTO companies (companies) VALUES ('optimize')")
+            conn.execute('INSERT INTO snapshot VALUES (?, ?, ?)', (os.path.basename(source), datetime.datetime.now().isoformat(), count))
+            conn.commit()
+        finally:
+            conn.close()
+        self.close()
+        os.replace(temp, self.path)
+        e = int(time.time() - first)
+        print("> The company index has " + str(count) + " companies, elapsed time = " + '{:02d}:{:02d}:{:02d}'.format(e // 3600, (e % 3600 // 60), e % 60))
+        return count
+
+    def __open(self, source: str):
+        if not zipfile.is_zipfile(source):
+            return open(source, 'r', encoding = 'utf-8', errors = 'replace', newline = '')
+        archive = zipfile.ZipFile(source)
+        names = [name for name in archive.namelist() if name.lower().endswith('.csv')]
+        if len(names) == 0:
+            archive.close()
+            raise Exception('The zip file "' + source + '" does not contain any CSV file.')
+        return io.TextIOWrapper(archive.open(names[0]), encoding = 'utf-8', errors = 'replace', newline = '')
+
+    def search(self, query: str, exactly: bool = True, limit: int = 0):
+        '''
+        Find the companies matching every term of the query as a word prefix. The hits are
+        ranked by relevance and returned with the same "title", "code" fields as the live search hits.
+        @param query The company name to search
+        @param exactly Set False to only keep the names containing the whole query, as the live search filtering does
+        @param limit The maximum number of hits, zero for the index default limit
+        '''
+        terms = index_terms(query)
+        if len(terms) == 0:
+            return []
+        expression = ' '.join(['"' + term + '"*' for term in terms])
+        sql = 'SELECT name, code FROM companies WHERE companies MATCH ?'
+        params = [expression]
+        if not exactly:
+            sql += ' AND instr(lower(name), ?) > 0'
+            params.append(query.lower())
+        sql += ' ORDER BY rank LIMIT ?'
+        params.append(limit if limit > 0 else INDEX_LIMIT)
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect('file:' + urllib.parse.quote(self.path) + '?mode=ro', uri = True, check_same_thread = False)
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{ 'title': name, 'code': code } for name, code in rows]
+
+    def close(self):
+        with self._lock:
+            if not self._conn is None:
+                self._conn.close()
+                self._conn = None
+
+class ScrapJournal:
+    '''
+    Append-only checkpoint journal kept in the output folder, every discovered target list, finished company
+    and completed query is written as one JSON line the moment it happens. When resuming, the journal of the
+    interrupted run is replayed so only the missing work is scheduled again.
+    '''
+
+    def __init__(self, folder: str, resume: bool = False):
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        if not os.path.exists(folder):
+            os.makedirs(folder, 0o777, True)
+        self.path = os.path.join(folder, "journal.jsonl")
+        self._queries = dict()
+        self._lock = Lock()
+        if resume:
+            if os.path.isfile(self.path):
+                self.__replay()
+            else:
+                print("> No journal found at \"" + self.path + "\", starting a new run.")
+        self._file = open(self.path, 'ab' if resume else 'wb')
+        self._size = self._file.tell()
+
+    def __replay(self):
+        count = 0
+        offset = 0
+        with open(self.path, 'rb') as file:
+            for line in file:
+                start = offset
+                offset += len(line)
+                line = line.strip()
+                if len(line) < 1:
+                    continue
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except:
+                    continue
+                event = record.get('event', None)
+                query = record.get('query', None)
+                if query is None:
+                    continue
+                state = self.state(query)
+                if event == 'targets':
+                    state['targets'] = record.get('targets', [])
+                    state['results'] = dict()
+                    state['offsets'] = dict()
+                    state['header'] = None
+                elif event == 'company':
+                    position = convertint(record.get('position', 0))
+                    state['results'][position] = CompanyRecord.imports(record.get('data', None))
+                    state['offsets'][position] = start
+                elif event == 'query':
+                    state['header'] = record.get('header', None)
+                count += 1
+        print("> Replayed " + str(count) + " journal records of " + str(len(self._queries)) + " queries.")
+
+    def state(self, query):
+        '''
+        Returns the recorded state of the query which holds its "targets", finished "results" and their journal
+        "offsets" by position and its "header" once the query is completed.
+        '''
+        state = self._queries.get(query, None)
+        if state is None:
+            state = { 'targets': None, 'results': dict(), 'offsets': dict(), 'header': None }
+            self._queries[query] = state
+        return state
+
+    def write(self, event, **fields):
+        '''
+        Append the event record, returns its byte offset in the journal which can be given to read().
+        '''
+        record = { 'event': event, 'time': time.time() }
+        record.update(fields)
+        line = (json.dumps(record, default = record_json) + "\n").encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                return None
+            offset = self._size
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size += len(line)
+            return offset
+
+    def read(self, offset: int):
+        '''
+        Read back the record written at the given byte offset.
+        '''
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            return json.loads(file.readline().decode('utf-8'))
+
+    def close(self):
+        with self._lock:
+            if not self._file is None:
+                self._file.close()
+                self._file = None
+
+class JsonLinesWriter:
+    '''
+    Streaming JSON Lines output, every company is written as one line to "results.jsonl" the moment its
+    result arrives, while "results.manifest.json" tracks the run state and receives the reports header at the end.
+    '''
+
+    def __init__(self, folder: str, queries = None):
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        if not os.path.exists(folder):
+            os.makedirs(folder, 0o777, True)
+        self.path = os.path.join(folder, "results.jsonl")
+        self.manifest = os.path.join(folder, "results.manifest.json")
+        self.count = 0
+        self._lock = Lock()
+        self._file = open(self.path, 'w', encoding = 'utf-8')
+        self.__manifest({ 'status': 'running', 'datetime': datetime.datetime.now().isoformat(), 'queries': queries, 'records': 0, 'file': os.path.basename(self.path) })
+
+    def __manifest(self, data):
+        temp = self.manifest + '.tmp'
+        with open(temp, 'w', encoding = 'utf-8') as file:
+            file.write(json.dumps(data, indent = 4))
+        os.replace(temp, self.manifest)
+
+    def record(self, query, position, data):
+        line = dict()
+        line['query'] = query
+        line['position'] = position
+        line.update(data)
+        text = json.dumps(line, default = record_json) + "\n"
+        with self._lock:
+            self._file.write(text)
+            self._file.flush()
+            self.count += 1
+
+    def finish(self, reports, headers):
+        with self._lock:
+            self._file.flush()
+            count = self.count
+        self.__manifest({ 'status': 'complete', 'datetime': datetime.datetime.now().isoformat(), 'records': count, 'file': os.path.basename(self.path), 'reports': reports, 'headers': headers })
+        return self.path
+
+    def close(self):
+        with self._lock:
+            if not self._file is None:
+                self._file.close()
+                self._file = None
+
+class ExcelWriter:
+    '''
+    Row-major XLSX output written in xlsxwriter constant memory mode, companies, officers and filing histories
+    are kept in separate sheets and every row is written once in order as the results arrive from the crawl.
+    '''
+
+    COMPANY_COLUMNS = ['Query', 'Number', 'Page', 'Company', 'Identity', 'Address', 'Status', 'Type', 'Incorporated', 'Dissolved', 'Profile']
+    OFFICER_COLUMNS = ['Query', 'Number', 'Identity', 'Company', 'Officer', 'Name', 'Status', 'Occupation', 'Role', 'Birth Date', 'Nationality', 'Address', 'Residence', 'Appointed/Resign']
+    HISTORY_COLUMNS = ['Query', 'Number', 'Identity', 'Company', 'Filing', 'Date', 'Info', 'URL']
+    QUERY_COLUMNS = ['Query', 'Companies', 'Date Time', 'Elapsed']
+
+    def __init__(self, folder: str):
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        if not os.path.exists(folder):
+            os.makedirs(folder, 0o777, True)
+        self.path = os.path.join(folder, "results.xlsx")
+        self._lock = Lock()
+        import xlsxwriter
+        self._book = xlsxwriter.Workbook(self.path, { 'constant_memory': True, 'strings_to_urls': False })
+        self._fmttitl = self._book.add_format({'align': 'left', "bold": True, "border": 1, 'bg_color': '#DDDDDD'})
+        self._fmtinfo = self._book.add_format({'align': 'left', "bold": False, "border": 1})
+        self._queries = self.__sheet("Queries", self.QUERY_COLUMNS, [40, 12, 28, 12])
+        self._companies = self.__sheet("Companies", self.COMPANY_COLUMNS, [24, 8, 6, 40, 12, 48, 12, 28, 16, 16, 48])
+        self._officers = self.__sheet("Officers", self.OFFICER_COLUMNS, [24, 8, 12, 40, 8, 32, 12, 24, 16, 16, 16, 48, 16, 20])
+        self._histories = self.__sheet("Histories", self.HISTORY_COLUMNS, [24, 8, 12, 40, 8, 14, 64, 48])
+        self._rows = { 'Queries': 1, 'Companies': 1, 'Officers': 1, 'Histories': 1 }
+
+    def __sheet(self, name, columns, widths):
+        sheet = self._book.add_worksheet(name)
+        for col in range(0, len(columns), 1):
+            sheet.set_column(col, col, widths[col])
+            sheet.write_string(0, col, columns[col], self._fmttitl)
+        sheet.freeze_panes(1, 0)
+        return sheet
+
+    def __write(self, sheet, values):
+        row = self._rows[sheet.name]
+        for col in range(0, len(values), 1):
+            value = values[col]
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                sheet.write_number(row, col, value, self._fmtinfo)
+            else:
+                sheet.write_string(row, col, convertstr(value) if not value is None else '-', self._fmtinfo)
+        self._rows[sheet.name] = row + 1
+
+    def record(self, query, data):
+        with self._lock:
+            over = data.get('overview', {})
+            number = data.get('number', 0)
+            identity = data.get('identity', '')
+            company = data.get('company', '')
+            self.__write(self._companies, [query, number, data.get('paging', 0), company, identity, over.get('address', '-'), over.get('status', '-'), over.get('type', '-'), over.get('incorporated', '-'), over.get('dissolved', '-'), data.get('profile', '-')])
+            users = data.get('officers', None)
+            if not users is None:
+                index = 1
+                for user in users:
+                    self.__write(self._officers, [query, number, identity, company, index, user.get('name', '-'), user.get('status', '-'), user.get('occupation', '-'), user.get('role', '-'), user.get('birth', '-'), user.get('nationality', '-'), user.get('address', '-'), user.get('residence', '-'), user.get('appointed', user.get('resigned', '-'))])
+                    index += 1
+            hist = data.get('histories', None)
+            if not hist is None:
+                for info in hist:
+                    self.__write(self._histories, [query, number, identity, company, info.get('no', '-'), info.get('date', '-'), info.get('desc', '-'), info.get('docs', '-')])
+
+    def finish(self, headers):
+        with self._lock:
+            for header in headers:
+                self.__write(self._queries, [header.get('keywords', ''), header.get('companies', 0), header.get('datetime', ''), header.get('elapsed', '')])
+            self._book.close()
+            self._book = None
+        return self.path
+
+    def close(self):
+        with self._lock:
+            if not self._book is None:
+                self._book.close()
+                self._book = None
+
+PARQUET_GROUP = 10000
+
+def parquet_date(text):
+    '''
+    Convert the date text shown by the Companies House pages ("1 January 2000" or "1 Jan 2000") into a date,
+    returns None when the text is missing or has another format.
+    '''
+    text = convertstr(text)
+    if isundefined(text):
+        return None
+    for fmt in ('%d %B %Y', '%d %b %Y', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+class ParquetWriter:
+    '''
+    Columnar output with typed columns, companies, officers and filing histories are normalized into
+    "companies.parquet", "officers.parquet" and "filings.parquet" and joined by the "identity" column.
+    Rows are buffered per table as the results arrive and written as one zstd compressed row group every
+    "PARQUET_GROUP" rows, pyarrow is only imported when the Parquet output is enabled.
+    '''
+
+    def __init__(self, folder: str, group: int = PARQUET_GROUP):
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        if not os.path.exists(folder):
+            os.makedirs(folder, 0o777, True)
+        import pyarrow
+        import pyarrow.parquet
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.group = maxval(int(group), 1)
+        self._lock = Lock()
+        text = pyarrow.string()
+        number = pyarrow.int32()
+        date = pyarrow.date32()
+        self._tables = dict()
+        self.__table(folder, 'companies', [('query', text), ('number', number), ('page', number), ('company', text), ('identity', text),
+            ('address', text), ('status', text), ('type', text), ('incorporated', date), ('dissolved', date), ('profile', text)])
+        self.__table(folder, 'officers', [('query', text), ('number', number), ('identity', text), ('officer', number), ('name', text),
+            ('status', text), ('occupation', text), ('role', text), ('birth', text), ('nationality', text), ('address', text),
+            ('residence', text), ('appointed', date), ('resigned', date)])
+        self.__table(folder, 'filings', [('query', text), ('number', number), ('identity', text), ('filing', number), ('date', date),
+            ('description', text), ('document', text)])
+
+    def __table(self, folder, name, fields):
+        schema = self._pa.schema(fields)
+        path = os.path.join(folder, name + ".parquet")
+        table = dict()
+        table['path'] = path
+        table['schema'] = schema
+        table['rows'] = dict([(field[0], []) for field in fields])
+        table['count'] = 0
+        table['writer'] = self._pq.ParquetWriter(path, schema, compression = 'zstd')
+        self._tables[name] = table
+
+    def __append(self, name, values):
+        table = self._tables[name]
+        rows = table['rows']
+        for key in rows:
+            rows[key].append(values.get(key, None))
+        table['count'] += 1
+        if table['count'] >= self.group:
+            self.__flush(table)
+
+    def __flush(self, table):
+        if table['count'] == 0:
+            return
+        data = self._pa.Table.from_pydict(table['rows'], schema = table['schema'])
+        table['writer'].write_table(data)
+        for key in table['rows']:
+            table['rows'][key] = []
+        table['count'] = 0
+
+    def record(self, query, data):
+        with self._lock:
+            over = data.get('overview', {})
+            number = data.get('number', 0)
+            identity = data.get('identity', '')
+            self.__append('companies', { 'query': query, 'number': number, 'page': data.get('paging', 0), 'company': data.get('company', ''), 'identity': identity,
+                'address': over.get('address', None), 'status': over.get('status', None), 'type': over.get('type', None),
+                'incorporated': parquet_date(over.get('incorporated', None)), 'dissolved': parquet_date(over.get('dissolved', None)), 'profile': data.get('profile', None) })
+            users = data.get('officers', None)
+            if not users is None:
+                index = 1
+                for user in users:
+                    values = dict(user)
+                    values.update({ 'query': query, 'number': number, 'identity': identity, 'officer': index })
+                    values['appointed'] = parquet_date(user.get('appointed', None))
+                    values['resigned'] = parquet_date(user.get('resigned', None))
+                    self.__append('officers', values)
+                    index += 1
+            hist = data.get('histories', None)
+            if not hist is None:
+                for info in hist:
+                    self.__append('filings', { 'query': query, 'number': number, 'identity': identity, 'filing': info.get('no', None),
+                        'date': parquet_date(info.get('date', None)), 'description': info.get('desc', None), 'document': info.get('docs', None) })
+
+    def finish(self):
+        with self._lock:
+            paths = []
+            for name in self._tables:
+                table = self._tables[name]
+                self.__flush(table)
+                table['writer'].close()
+                table['writer'] = None
+                paths.append(table['path'])
+        return paths
+
+    def close(self):
+        with self._lock:
+            for name in self._tables:
+                table = self._tables[name]
+                if not table['writer'] is None:
+                    table['writer'].close()
+                    table['writer'] = None
+
+class CompanyRegistry:
+    '''
+    Run-wide registry of crawled companies keyed by company code, the first task that claims a code crawls it
+    while every other query that matched the same company waits for that crawl and reuses its details.
+    Only the dedupe state is kept for every code, the crawled details are held just until the tasks already
+    waiting for them are served, the later duplicates read them back from the journal at the stored offset.
+    '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = dict()
+        self.reused = 0
+
+    def __entry(self, code):
+        entry = self._entries.get(code, None)
+        if entry is None:
+            entry = { 'event': Event(), 'stored': Event(), 'data': None, 'missing': False, 'offset': None, 'waiters': 0 }
+            self._entries[code] = entry
+        return entry
+
+    def claim(self, code):
+        '''
+        Claim the company code, returns a tuple of (owner, entry) where owner is True when the caller must
+        crawl the company and publish it with complete(), otherwise the entry must be read with take().
+        '''
+        with self._lock:
+            if not code in self._entries:
+                return True, self.__entry(code)
+            entry = self._entries[code]
+            entry['waiters'] += 1
+            self.reused += 1
+            return False, entry
+
+    def complete(self, code, data):
+        with self._lock:
+            entry = self.__entry(code)
+            entry['missing'] = data is None
+            if entry['waiters'] > 0:
+                entry['data'] = data
+        entry['event'].set()
+        if data is None:
+            entry['stored'].set()
+
+    def stored(self, code, offset):
+        '''
+        Record the journal offset of the crawled company, later duplicates read it back from there.
+        '''
+        with self._lock:
+            entry = self.__entry(code)
+            entry['offset'] = offset
+        entry['stored'].set()
+
+    def seed(self, code, offset):
+        '''
+        Register a company restored from the journal of the previous run, the offset is None when it was not found.
+        '''
+        with self._lock:
+            if code in self._entries:
+                return
+            entry = self.__entry(code)
+            entry['missing'] = offset is None
+            entry['offset'] = offset
+        entry['event'].set()
+        entry['stored'].set()
+
+    def take(self, entry):
+        '''
+        Wait for the claimed entry, returns a tuple of (data, offset) where data is the crawled details while
+        they are still held, otherwise the journal offset to read them from. Both are None when not found.
+        '''
+        entry['event'].wait()
+        with self._lock:
+            data = entry['data']
+            entry['waiters'] = maxval(entry['waiters'] - 1, 0)
+            if entry['waiters'] < 1:
+                entry['data'] = None
+        if entry['missing']:
+            return None, None
+        if not data is None:
+            return data, None
+        entry['stored'].wait()
+        return None, entry['offset']
+
+class AsyncHttpClient:
+    '''
+    Minimal asyncio HTTP/1.1 client on top of asyncio streams, idle keep-alive connections are kept per host
+    and reused by the coroutines of the same event loop.
+    '''
+
+    def __init__(self, size: int = 100, timeout: float = 30, agent: str = None):
+        self._size = maxval(int(size), 1)
+        self._timeout = timeout
+        self._agent = agent if not isundefined(agent) else 'Mozilla/5.0 (compatible; chscraper)'
+        self._idle = dict()
+
+    async def __checkout(self, key):
+        conns = self._idle.get(key, None)
+        while not conns is None and len(conns) > 0:
+            reader, writer = conns.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            writer.close()
+        scheme, host, port = key
+        if port is None:
+            port = 443 if scheme == 'https' else 80
+        context = ssl.create_default_context() if scheme == 'https' else None
+        conn = await asyncio.wait_for(asyncio.open_connection(host, port, ssl = context), self._timeout)
+        return conn, False
+
+    def __checkin(self, key, conn):
+        conns = self._idle.setdefault(key, [])
+        if len(conns) < self._size:
+            conns.append(conn)
+        else:
+            conn[1].close()
+
+    async def __receive(self, reader, method):
+        line = await reader.readline()
+        if len(line) < 1:
+            raise ConnectionResetError('The connection was closed by the server.')
+        parts = line.decode('latin-1').strip().split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise http.client.BadStatusLine(line)
+        status = int(parts[1])
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if len(line) < 1 or line in (b'\r\n', b'\n'):
+                break
+            text = line.decode('latin-1')
+            if text.find(':') != -1:
+                name, value = text.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        close = headers.get('connection', '').lower() == 'close' or parts[0] == 'HTTP/1.0'
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            return status, headers, b'', close
+        if headers.get('transfer-encoding', '').lower().find('chunked') != -1:
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    while True:
+                        line = await reader.readline()
+                        if len(line) < 1 or line in (b'\r\n', b'\n'):
+                            break
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            return status, headers, b''.join(chunks), close
+        length = headers.get('content-length', None)
+        if not length is None:
+            return status, headers, await reader.readexactly(int(length)), close
+        return status, headers, await reader.read(), True
+
+    async def request(self, url, method = 'GET', headers = None, redirects = 5):
+        '''
+        Send the request through a pooled connection and returns HttpResponse, redirects are followed.
+        @url The absolute address to request
+        @headers Optional dictionary of extra request headers
+        '''
+        for hop in range(0, redirects + 1, 1):
+            parts = urllib.parse.urlsplit(url)
+            scheme = parts.scheme.lower() if not isundefined(parts.scheme) else 'http'
+            key = (scheme, parts.hostname, parts.port)
+            path = parts.path if not isundefined(parts.path) else '/'
+            if not isundefined(parts.query):
+                path += '?' + parts.query
+            send = { 'Host': parts.netloc, 'User-Agent': self._agent, 'Accept': 'text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8', 'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive' }
+            if not headers is None:
+                send.update(headers)
+            data = method + ' ' + path + ' HTTP/1.1\r\n'
+            for name in send:
+                data += name + ': ' + str(send[name]) + '\r\n'
+            data = (data + '\r\n').encode('latin-1')
+            for attempt in range(0, 2, 1):
+                conn, reused = await self.__checkout(key)
+                reader, writer = conn
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    status, rheaders, body, close = await asyncio.wait_for(self.__receive(reader, method), self._timeout)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, http.client.BadStatusLine):
+                    writer.close()
+                    if not reused or attempt > 0:
+                        raise
+                except:
+                    writer.close()
+                    raise
+            if close:
+                writer.close()
+            else:
+                self.__checkin(key, conn)
+            location = rheaders.get('location', None)
+            if status in (301, 302, 303, 307, 308) and not isundefined(location) and hop < redirects:
+                url = urllib.parse.urljoin(url, location)
+                if status == 303:
+                    method = 'GET'
+                continue
+            encoding = rheaders.get('content-encoding', '').lower()
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+            return HttpResponse(status, rheaders, body, url)
+        raise Exception('Too many redirects while requesting "' + url + '".')
+
+    def close(self):
+        for conns in self._idle.values():
+            for reader, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+def create_pool(config: ScrapSettings, size: int, metrics = None):
+    '''
+    Create the driver pool of the configured engine, the "http" engine gets HttpDriver instances with a Chrome
+    fallback pool and the "api" engine gets a pooled HttpClient as the pool client.
+    @param config The settings giving the engine and the driver options
+    @param size The maximum number of live drivers
+    @param metrics Optional ScrapMetrics recording the driver startup time
+    '''
+    if config.engine == 'http':
+        client = HttpClient(size)
+        fallback = DriverPool(config, size)
+        pool = DriverPool(config, size, lambda: HttpDriver(client, fallback))
+        pool.attach(client)
+        pool.attach(fallback)
+        pool.metrics = fallback.metrics = metrics
+        return pool
+    pool = DriverPool(config, size)
+    pool.metrics = metrics
+    if config.engine == 'api':
+        pool.client = pool.attach(HttpClient(size))
+    return pool
+
+def create_limiter(config: ScrapSettings):
+    '''
+    Create the rate limiter of the configured engine, the "api" engine is paced by the REST API budget.
+    '''
+    if config.engine == 'api':
+        budget = config.apibudget
+        rate = budget * 0.9 / API_WINDOW
+        return RateLimiter(rate, rate, maxval(int(budget / 10), 1))
+    return RateLimiter(config.rate, config.ratemax)
+
+class ScrapProvider:
+
+    def __init__(self, config: ScrapSettings, pool = None, limiter = None):
+        if config is None:
+            config = ScrapSettings()
+            config.reload([])
+        config.prepare()
+        self.config = config
+        self.shared = dict()
+        if not pool is None:
+            self.shared['pool'] = pool
+        if not limiter is None:
+            self.shared['limiter'] = limiter
+        self.pool = None
+        self.cache = None
+        self.index = None
+        self.limiter = None
+        self.api = None
+        self.metrics = ScrapMetrics()
+        self.profiler = None
+        self.journal = None
+        self.stream = None
+        self.excel = None
+        self.parquet = None
+        self.registry = CompanyRegistry()
+        self.retain = True
+        self.workers = None
+        self.tasks = None
+        self.done = None
+        self.size = 0
+        self.claiming = False
+        self.loop = None
+        self.client = None
+        self.semaphore = None
+        self.sequence = { 'query': None, 'next': 0, 'buffer': dict() }
+        self.number = 1
+        self.baseline = dict()
+
+    def __createPool(self, size):
+        pool = self.shared.get('pool', None)
+        if pool is None:
+            pool = create_pool(self.config, size, self.metrics)
+        self.api = pool.client
+        return pool
+
+    def __createLimiter(self):
+        limiter = self.shared.get('limiter', None)
+        if limiter is None:
+            limiter = create_limiter(self.config)
+        return limiter
+
+    def __closeShared(self):
+        if not 'pool' in self.shared:
+            self.pool.close()
+        if not 'limiter' in self.shared:
+            self.limiter.close()
+        self.pool = None
+        self.api = None
+
+    def __fetchApi(self, path: str, params: dict, kind: str):
+        url = self.config.apiurl.rstrip("/") + path
+        if not params is None:
+            url = url + "?" + urllib.parse.urlencode(params)
+        token = base64.b64encode((self.config.apikey + ":").encode('utf-8')).decode('ascii')
+        headers = { 'Authorization': 'Basic ' + token, 'Accept': 'application/json' }
+        metrics = self.metrics
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            self.limiter.acquire()
+            metrics.observe('pacing', time.perf_counter() - started, kind)
+            started = time.perf_counter()
+            response = self.api.request(url, headers = headers)
+            metrics.observe('navigation', time.perf_counter() - started, kind)
+            if response.status == 429 or response.status >= 500:
+                attempt += 1
+                self.__backoff(url, kind, attempt, retry_after(response.headers))
+                continue
+            self.limiter.success()
+            if response.status == 404:
+                return None
+            if response.status == 401:
+                raise Exception('The Companies House REST API rejected the API key, please check "restapi_token".')
+            if response.status != 200:
+                raise Exception('The Companies House REST API answered "' + url + '" with status ' + str(response.status) + '.')
+            started = time.perf_counter()
+            data = json.loads(response.text())
+            metrics.observe('extraction', time.perf_counter() - started, kind)
+            return data
+
+    def __scrapApiPage(self, query: str):
+        first = time.time()
+        mrows = self.config.mrows
+        qlower = query.lower()
+        hits = []
+        kept = 0
+        paging = 0
+        start = 0
+        while True:
+            data = self.__fetchApi('/search/companies', { 'q': query, 'items_per_page': API_PAGE, 'start_index': start }, 'search')
+            if data is None:
+                break
+            if start == 0:
+                matches = convertint(data.get('total_results', 0))
+                expect = int(math.ceil(matches / 20))
+                paging = expect if self.config.mpage < 1 else minval(self.config.mpage, expect)
+                if matches == 0:
+                    print('> The search with query "' + query + '" did not yield any results.')
+                    return []
+                print('> The search with query "' + query + '" has found ' + str(matches) + ' records with expected ' + str(paging) + " pages to scrap.")
+            items = data.get('items', [])
+            found = []
+            for item in items:
+                code = convertstr(item.get('company_number', None))
+                if isundefined(code):
+                    continue
+                found.append({ 'title': convertstr(item.get('title', None)).strip(), 'code': code, 'href': self.config.landing.rstrip("/") + "/company/" + code })
+            hits.extend(found)
+            kept += self.__countHits(found, qlower)
+            start += len(items)
+            if len(items) == 0 or len(hits) >= paging * 20 or (mrows > 0 and kept >= mrows):
+                break
+        return self.__mergePages(query, self.__chunkHits(hits, paging), paging, first)
+
+    def __chunkHits(self, hits, paging):
+        pages = dict()
+        for number in range(1, paging + 1, 1):
+            if (number - 1) * 20 >= len(hits):
+                break
+            pages[number] = hits[(number - 1) * 20:number * 20]
+        return pages
+
+    def __scrapIndexPage(self, query: str):
+        first = time.time()
+        limit = 0
+        if self.config.mpage > 0:
+            limit = self.config.mpage * 20
+        if self.config.mrows > 0 and self.config.mscore <= 0 and (limit < 1 or self.config.mrows < limit):
+            limit = self.config.mrows
+        started = time.perf_counter()
+        hits = self.index.search(query, self.config.exactly, limit)
+        self.metrics.observe('navigation', time.perf_counter() - started, 'index')
+        if len(hits) == 0:
+            print('> The company index does not have any company matching query "' + query + '".')
+            return []
+        landing = self.config.landing.rstrip("/")
+        for hit in hits:
+            hit['href'] = landing + "/company/" + hit['code']
+        paging = int(math.ceil(len(hits) / 20))
+        print('> The company index has resolved ' + str(len(hits)) + ' records with query "' + query + '" in ' + str(int((time.perf_counter() - started) * 1000)) + ' ms.')
+        return self.__mergePages(query, self.__chunkHits(hits, paging), paging, first)
+
+    def __scrapApiList(self, path: str, kind: str, limit: int = 0):
+        items = []
+        start = 0
+        number = 0
+        while True:
+            data = self.__fetchApi(path, { 'items_per_page': API_PAGE, 'start_index': start }, kind)
+            if data is None:
+                break
+            batch = data.get('items', [])
+            items.extend(batch)
+            number += 1
+            start += len(batch)
+            total = convertint(data.get('total_count', data.get('total_results', 0)))
+            if len(batch) == 0 or start >= total or (limit > 0 and number >= limit):
+                break
+        return items
+
+    def __scrapApiHist(self, target):
+        state = self.__histBegin(target)
+        path = "/company/" + target['code'] + "/filing-history"
+        start = 0
+        while True:
+            data = self.__fetchApi(path, { 'items_per_page': API_PAGE, 'start_index': start }, 'filings')
+            if data is None:
+                break
+            state['number'] += 1
+            batch = data.get('items', [])
+            output = state['output']
+            known = False
+            for row in api_histories(batch, self.config.landing, len(output) + 1):
+                if filing_key(row) in state['keys']:
+                    known = True
+                    break
+                output.append(row)
+            start += len(batch)
+            if known or len(batch) == 0 or start >= convertint(data.get('total_count', 0)):
+                break
+            if self.config.hpage > 0 and state['number'] >= self.config.hpage:
+                break
+        return self.__histEnd(state, target)
+
+    def __scrapApiMain(self, target, tname):
+        code = target['code']
+        data = self.__fetchApi("/company/" + code, None, 'company')
+        if data is None:
+            print('> The company with code "' + code + '" is not found..')
+            return None
+        result = CompanyRecord(number = target['index'], paging = target['page'], company = target['name'], identity = target['code'], profile = target['href'])
+        print("> " + tname + " => Reading company overview, history and officers from the REST API (" + target['name'] + ").")
+        result['overview'] = api_overview(data, target['name'])
+        if self.config.history:
+            result['histories'] = self.__scrapApiHist(target)
+        if self.config.officer:
+            result['officers'] = api_officers(self.__scrapApiList("/company/" + code + "/officers", 'officers'))
+        return result
+
+    def __cacheLookup(self, url: str, conditional: bool):
+        cache = self.cache
+        if cache is None:
+            return None, None, None
+        entry = cache.lookup(url)
+        if entry is None:
+            return None, None, None
+        if entry['fresh']:
+            cache.hits += 1
+            self.metrics.count('cache_hits', entry.get('kind', None))
+            return parse_html(entry['body'], url), entry, None
+        headers = None
+        if conditional:
+            headers = dict()
+            if not isundefined(entry.get('etag', None)):
+                headers['If-None-Match'] = entry['etag']
+            if not isundefined(entry.get('modified', None)):
+                headers['If-Modified-Since'] = entry['modified']
+        return None, entry, headers
+
+    def __cacheRevalidated(self, entry, headers):
+        self.cache.revalidated += 1
+        self.cache.touch(entry, headers)
+        return parse_html(entry['body'], entry['url'])
+
+    def __cacheStore(self, url: str, kind: str, root, body, status, headers):
+        cache = self.cache
+        if cache is None:
+            return
+        cache.misses += 1
+        if not status in (0, 200, 404, 410):
+            return
+        negative = False
+        if kind == 'company':
+            negative = not find_element_by_id(root, 'page-not-found-header') is None
+        elif kind == 'search':
+            negative = extract_matches(root) == 0
+        cache.store(url, kind, body, status, headers, negative)
+
+    def __fetchPage(self, driver, url: str, kind: str):
+        http = isinstance(driver, HttpDriver)
+        root, entry, headers = self.__cacheLookup(url, http)
+        if not root is None:
+            return root
+        metrics = self.metrics
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            self.limiter.acquire()
+            metrics.observe('pacing', time.perf_counter() - started, kind)
+            started = time.perf_counter()
+            status = 0
+            if http:
+                driver.get(url, headers)
+                status = driver.status
+                metrics.observe('navigation', time.perf_counter() - started, kind)
+                if status == 304 and not entry is None:
+                    self.limiter.success()
+                    return self.__cacheRevalidated(entry, driver.headers)
+            else:
+                self.config.scripting(driver, kind)
+                driver.get(url)
+                metrics.observe('navigation', time.perf_counter() - started, kind)
+            started = time.perf_counter()
+            root = page_snapshot(driver)
+            metrics.observe('extraction', time.perf_counter() - started, kind)
+            if not is_throttled(root, status):
+                break
+            attempt += 1
+            self.__backoff(url, kind, attempt, retry_after(driver.headers) if http else None)
+        self.limiter.success()
+        if not self.cache is None:
+            self.__cacheStore(url, kind, root, driver.page_source, driver.status if http else 0, driver.headers if http else None)
+        return root
+
+    def __backoff(self, url: str, kind: str, attempt: int, after = None):
+        self.metrics.count('retries', kind)
+        if attempt > RETRY_LIMIT:
+            raise Exception('The server kept throttling "' + url + '", giving up after ' + str(RETRY_LIMIT) + ' retries.')
+        pause = self.limiter.throttled(after)
+        print('> Throttled while loading "' + url + '", backing off for ' + str(round(pause, 1)) + ' seconds (rate ' + str(round(self.limiter.rate, 2)) + '/s)..')
+        return pause
+
+    def __fetchBrowser(self, url: str, kind: str):
+        driver = self.pool.acquire()
+        try:
+            return self.__fetchPage(driver, url, kind)
+        finally:
+            self.pool.release(driver)
+
+    async def __fetchAsync(self, url: str, kind: str):
+        loop = asyncio.get_running_loop()
+        root, entry, headers = None, None, None
+        if not self.cache is None:
+            root, entry, headers = await loop.run_in_executor(None, self.__cacheLookup, url, True)
+        if not root is None:
+            return root
+        metrics = self.metrics
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.limiter.reserve())
+            metrics.observe('pacing', time.perf_counter() - started, kind)
+            response = None
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await self.client.request(url, headers = headers)
+                except Exception as e:
+                    print('> Async engine failed to load "' + url + '" (' + str(e) + '), falling back to browser..')
+                metrics.observe('navigation', time.perf_counter() - started, kind)
+            if response is None:
+                break
+            if response.status == 304 and not entry is None:
+                self.limiter.success()
+                return await loop.run_in_executor(None, self.__cacheRevalidated, entry, response.headers)
+            started = time.perf_counter()
+            body = response.text() if response.is_html() else ''
+            root = parse_html(body, response.url)
+            metrics.observe('extraction', time.perf_counter() - started, kind)
+            if is_throttled(root, response.status):
+                attempt += 1
+                self.__backoff(url, kind, attempt, retry_after(response.headers))
+                continue
+            self.limiter.success()
+            if response.status in (200, 404, 410) and response.is_html() and not requires_script(root):
+                if not self.cache is None:
+                    await loop.run_in_executor(None, self.__cacheStore, url, kind, root, body, response.status, response.headers)
+                return root
+            break
+        return await loop.run_in_executor(None, self.__fetchBrowser, url, kind)
+
+    async def __scrapPageAsync(self, query: str):
+        first = time.time()
+        root = await self.__fetchAsync(self.__searchUrl(query, 1), 'search')
+        hits = extract_hits(root)
+        matches, paging = self.__planPages(query, root)
+        if matches == 0:
+            return []
+        mrows = self.config.mrows
+        qlower = query.lower()
+        pages = { 1: hits }
+        kept = self.__countHits(hits, qlower)
+        stop = hits is None or len(hits) == 0 or (mrows > 0 and kept >= mrows)
+        if matches == -1:
+            number = 1
+            while not stop and number < paging:
+                number += 1
+                hits = extract_hits(await self.__fetchAsync(self.__searchUrl(query, number), 'search'))
+                pages[number] = hits
+                kept += self.__countHits(hits, qlower)
+                stop = hits is None or len(hits) == 0 or (mrows > 0 and kept >= mrows)
+        elif paging > 1 and not stop:
+            last = paging
+            if mrows > 0 and self.config.exactly and self.config.mscore <= 0:
+                last = minval(paging, int(math.ceil(mrows / 20)))
+            numbers = list(range(2, last + 1, 1))
+            print("> Fetching " + str(len(numbers)) + " remaining result pages concurrently..")
+            roots = await asyncio.gather(*[self.__fetchAsync(self.__searchUrl(query, number), 'search') for number in numbers])
+            for number, root in zip(numbers, roots):
+                pages[number] = extract_hits(root)
+        return self.__mergePages(query, pages, paging, first)
+
+    async def __scrapHistAsync(self, target):
+        state = self.__histBegin(target)
+        url = state['url']
+        while not isundefined(url):
+            url = self.__histNext(state, await self.__fetchAsync(url, 'filings'))
+        return self.__histEnd(state, target)
+
+    async def __scrapUserAsync(self, target):
+        url = self.config.landing.rstrip("/") + "/company/" + target['code'] + "/officers"
+        return extract_officers(await self.__fetchAsync(url, 'officers'))
+
+    async def __scrapMainAsync(self, target, tname):
+        code = target['code']
+        root = await self.__fetchAsync(self.config.landing.rstrip("/") + "/company/" + code, 'company')
+        enode = find_element_by_id(root, 'page-not-found-header')
+        if not enode is None:
+            print('> The company with code "' + code + '" is not found..')
+            return None
+        result = CompanyRecord(number = target['index'], paging = target['page'], company = target['name'], identity = target['code'], profile = target['href'])
+        print("> " + tname + " => Scraping company overview, history and officers information (" + target['name'] + ").")
+        result['overview'] = self.__scrapView(root, target)
+        jobs = []
+        if self.config.history:
+            jobs.append(self.__scrapHistAsync(target))
+        if self.config.officer:
+            jobs.append(self.__scrapUserAsync(target))
+        values = await asyncio.gather(*jobs)
+        if self.config.history:
+            result['histories'] = values.pop(0)
+        if self.config.officer:
+            result['officers'] = values.pop(0)
+        return result
+
+    async def __workerAsync(self, items, collect, counter, tname):
+        while len(items) > 0:
+            position, target = items.pop()
+            res = None
+            try:
+                res = await self.__scrapMainAsync(target, tname)
+            except Exception as e:
+                print("> " + tname + " => Failed to scrap \"" + str(target.get('name', '')) + "\": " + str(e))
+            collect(position, res)
+            counter[0] += 1
+            print("> Completed " + str(counter[0]) + " of " + str(counter[1]) + " companies (" + str(get_percent_flo(counter[0], counter[1])) + "%).")
+
+    async def __crawlAsync(self, pending, collect):
+        if len(pending) == 0:
+            return
+        items = list(reversed(pending))
+        counter = [0, len(pending)]
+        mtask = minval(self.config.concurrency, len(pending))
+        print("> Crawling " + str(len(pending)) + " companies with " + str(mtask) + " coroutines..")
+        await asyncio.gather(*[self.__workerAsync(items, collect, counter, "Task-" + str(number + 1)) for number in range(0, mtask, 1)])
+
+    def __searchUrl(self, query: str, number: int):
+        url = self.config.landing.rstrip("/") + "/search/companies?q=" + urllib.parse.quote(query)
+        if number > 1:
+            url += "&page=" + str(number)
+        return url
+
+    def __scrapHits(self, driver, query: str, number: int):
+
+        return self.__fetchPage(driver, self.__searchUrl(query, number), 'search')
+
+    def __scrapHitsTask(self, query, number, tname):
+        driver = None
+        try:
+            driver = self.pool.acquire()
+            return extract_hits(self.__scrapHits(driver, query, number))
+        except Exception as e:
+            print("> " + tname + " => Failed to fetch result page " + str(number) + " of query \"" + query + "\": " + str(e))
+            return e
+        finally:
+            self.pool.release(driver)
+
+    def __countHits(self, hits, qlower):
+        if hits is None:
+            return 0
+        return len(self.__scoreHits(self.__matchHits(hits, qlower), qlower))
+
+    def __matchHits(self, hits, qlower):
+        if self.config.exactly:
+            return hits
+        return [hit for hit in hits if hit['title'].lower().find(qlower) != -1]
+
+    def __scoreHits(self, hits, qlower):
+        if self.config.mscore <= 0 or len(hits) == 0:
+            return hits
+        scores = score_names(qlower, [hit['title'] for hit in hits])
+        return [hit for hit, score in zip(hits, scores) if score >= self.config.mscore]
+
+    def __createCache(self):
+        if not self.config.caching:
+            return None
+        folder = self.config.cachedir
+        if isundefined(folder):
+            folder = os.path.join(self.config.output, "cache")
+        return PageCache(folder, self.config.cachemax, self.config.cachettl)
+
+    def __planPages(self, query: str, root):
+        matches = extract_matches(root)
+        expect = 10000
+        if matches > -1:
+            expect = 0 if matches == 0 else int(math.ceil(matches / 20))
+        mpage = self.config.mpage
+        paging = expect if mpage < 1 else minval(mpage, expect)
+        if matches == -1:
+            print('> We could not found count of companies that available for query "' + query + '", we will run force mode with max pages = ' + str(paging) + ".")
+        elif matches == 0:
+            print('> The search with query "' + query + '" did not yield any results.')
+        else:
+            print('> The search with query "' + query + '" has found ' + str(matches) + ' records with expected ' + str(paging) + " pages to scrap.")
+        return matches, paging
+
+    def __scrapPage(self, query: str):
+        first = time.time()
+        driver = self.pool.acquire()
+        try:
+            root = self.__scrapHits(driver, query, 1)
+            hits = extract_hits(root)
+            matches, paging = self.__planPages(query, root)
+            if matches == 0:
+                return []
+            mrows = self.config.mrows
+            qlower = query.lower()
+            pages = { 1: hits }
+            kept = self.__countHits(hits, qlower)
+            stop = hits is None or len(hits) == 0 or (mrows > 0 and kept >= mrows)
+            if matches == -1:
+                number = 1
+                while not stop and number < paging:
+                    number += 1
+                    hits = extract_hits(self.__scrapHits(driver, query, number))
+                    pages[number] = hits
+                    kept += self.__countHits(hits, qlower)
+                    stop = hits is None or len(hits) == 0 or (mrows > 0 and kept >= mrows)
+        finally:
+            self.pool.release(driver)
+        if matches > 0 and paging > 1 and not stop:
+            mtask = minval(maxval(self.config.thread, 1), paging - 1)
+            print("> Fetching " + str(paging - 1) + " remaining result pages with " + str(mtask) + " threads..")
+            tasks = Queue(mtask * 2)
+            done = Queue()
+            workers = []
+            for number in range(0, mtask, 1):
+                thread = ThreadTask(self.__scrapHitsTask, query, tasks, done, number + 1)
+                workers.append(thread)
+                thread.start()
+            following = 2
+            prefix = 1
+            pending = 0
+            failures = dict()
+            try:
+                while True:
+                    if not stop and following <= paging:
+                        try:
+                            tasks.put_nowait((following, following))
+                            following += 1
+                            pending += 1
+                            continue
+                        except Full:
+                            pass
+                    if pending == 0:
+                        break
+                    number, hits = done.get()
+                    pending -= 1
+                    if isinstance(hits, Exception):
+                        failures[number] = failures.get(number, 0) + 1
+                        if failures[number] > PAGE_RETRIES:
+                            raise Exception('The result page ' + str(number) + ' of query "' + query + '" failed ' + str(failures[number]) + ' times: ' + str(hits))
+                        print("> Retrying result page " + str(number) + " of query \"" + query + "\"..")
+                        tasks.put((number, number))
+                        pending += 1
+                        continue
+                    pages[number] = hits
+                    while not stop and (prefix + 1) in pages:
+                        prefix += 1
+                        hits = pages[prefix]
+                        kept += self.__countHits(hits, qlower)
+                        stop = hits is None or len(hits) == 0 or (mrows > 0 and kept >= mrows)
+            finally:
+                for thread in workers:
+                    tasks.put(None)
+                for thread in workers:
+                    thread.join()
+        return self.__mergePages(query, pages, paging, first)
+
+    def __mergePages(self, query: str, pages: dict, paging: int, first: float):
+        mrows = self.config.mrows
+        qlower = query.lower()
+        result = []
+        count = 0
+        skipped = 0
+        for number in range(1, paging + 1, 1):
+            hits = pages.get(number, None)
+            if hits is None:
+                print("--- [Page " + str(number - 1) + "] 100% completed (no more pages are available)..")
+                break
+            prog = get_percent_flo(number, paging)
+            print("--- [Page " + str(number) + "] " + str(prog) + "% completed..")
+            rows = 0
+            matched = self.__matchHits(hits, qlower)
+            kept = self.__scoreHits(matched, qlower)
+            skipped += len(matched) - len(kept)
+            for hit in kept:
+                title = hit['title']
+                if mrows > 0 and count + 1 > mrows:
+                    break
+                code = hit['code']
+                node = dict()
+                node['page'] = number
+                node['rows'] = rows
+                node['index'] = count + 1
+                node['code'] = code
+                node['name'] = title
+                node['href'] = hit['href']
+                print("------ [" + str(count).zfill(6) + " in page " + str(number).zfill(3) + " at row " + str(rows + 1).zfill(2) + "] " + title + " (" + code + ")")
+                result.append(node)
+                count += 1
+                rows += 1
+            if mrows > 0 and count >= mrows:
+                print("> Maximum records has reached.")
+                break
+            if len(hits) == 0:
+                print("> Search terminated, no more records can be founded.")
+                break
+        if skipped > 0:
+            print("> " + str(skipped) + " search hits scored below the name matching threshold and will not be crawled.")
+            self.metrics.count('unmatched', None, skipped)
+        e = int(time.time() - first)
+        print("> Finally, we've found " + str(len(result)) + ' records with query "' + query + '", elapsed time = ' + '{:02d}:{:02d}:{:02d}'.format(e // 3600, (e % 3600 // 60), e % 60))
+        return result
+
+    def __scrapUser(self, driver, target):
+        code = target['code']
+        url = self.config.landing.rstrip("/") + "/company/" + code + "/officers"
+        return extract_officers(self.__fetchPage(driver, url, 'officers'))
+
+    def __histBegin(self, target):
+        code = target['code']
+        known = self.baseline.get(code, None)
+        state = dict()
+        state['known'] = known
+        state['keys'] = set() if known is None else set([filing_key(data) for data in known])
+        state['output'] = []
+        state['number'] = 0
+        state['url'] = self.config.landing.rstrip("/") + "/company/" + code + "/filing-history"
+        return state
+
+    def __histNext(self, state, root):
+        state['number'] += 1
+        output = state['output']
+        rows = extract_histories(root, len(output) + 1)
+        for data in rows:
+            if filing_key(data) in state['keys']:
+                return None
+            output.append(data)
+        if len(rows) == 0:
+            return None
+        if self.config.hpage > 0 and state['number'] >= self.config.hpage:
+            return None
+        return extract_next_page(root)
+
+    def __histEnd(self, state, target):
+        output = state['output']
+        if not state['known'] is None:
+            print("> Found " + str(len(output)) + " new filings for company \"" + target['name'] + "\" after " + str(state['number']) + " pages.")
+            output = merge_histories(output, state['known'])
+        return output
+
+    def __scrapHist(self, driver, target):
+        state = self.__histBegin(target)
+        url = state['url']
+        while not isundefined(url):
+            url = self.__histNext(state, self.__fetchPage(driver, url, 'filings'))
+        return self.__histEnd(state, target)
+
+    def __loadBaseline(self):
+        baseline = dict()
+        if not self.config.increment:
+            return baseline
+        folder = self.config.output
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        path = os.path.join(folder, "results.json")
+        lines = os.path.join(folder, "results.jsonl")
+        if not os.path.isfile(path) and not os.path.isfile(lines):
+            print("> No previous results found at \"" + path + "\", filing histories will be crawled in full.")
+            return baseline
+        if os.path.isfile(path) and os.path.isfile(lines) and os.path.getmtime(lines) > os.path.getmtime(path):
+            path = lines
+        records = []
+        try:
+            if path != lines and os.path.isfile(path):
+                with open(path, 'r') as file:
+                    data = json.loads(file.read())
+                for node in data.get('results', []):
+                    records.extend(node.get('matches', []))
+            else:
+                with open(lines, 'r', encoding = 'utf-8') as file:
+                    for line in file:
+                        if len(line.strip()) > 0:
+                            records.append(json.loads(line))
+        except Exception as e:
+            print("> Failed to read previous results (" + str(e) + "), filing histories will be crawled in full.")
+            return baseline
+        for record in records:
+            hist = record.get('histories', None)
+            if not hist is None:
+                baseline[record['identity']] = [FilingRecord.imports(data) for data in hist]
+        print("> Loaded previous filing histories of " + str(len(baseline)) + " companies.")
+        return baseline
+
+    def __scrapView(self, root, target):
+
+        return extract_overview(root, target['name'])
+
+    def __scrapMain(self, driver, target, tname):
+        code = target['code']
+        root = self.__fetchPage(driver, self.config.landing.rstrip("/") + "/company/" + code, 'company')
+        enode = find_element_by_id(root, 'page-not-found-header')
+        if not enode is None: 
+            print('> The company with code "' + code + '" is not found..')
+            return None
+        result = CompanyRecord(number = target['index'], paging = target['page'], company = target['name'], identity = target['code'], profile = target['href'])
+        print("> " + tname + " => Scraping company overview information (" + target['name'] + ").")
+        result['overview'] = self.__scrapView(root, target)
+        if self.config.history:
+            print("> " + tname + " => Scraping company history information (" + target['name'] + ").")
+            result['histories'] = self.__scrapHist(driver, target)            
+        if self.config.officer:
+            print("> " + tname + " => Scraping company officers information (" + target['name'] + ").")
+            result['officers'] = self.__scrapUser(driver, target)
+        return result
+
+    def __profiled(self, stage: str, func, *args):
+        if self.profiler is None:
+            return func(*args)
+        return self.profiler.run(stage, func, *args)
+
+    def __scrapJob(self, query, target, tname):
+
+        return self.__profiled('scrap_task', self.__scrapTask, query, target, tname)
+
+    def __scrapTask(self, query, target, tname):
+        self.metrics.scope(query)
+        owner, entry = self.registry.claim(target['code'])
+        if not owner:
+            data = self.__recall(entry)
+            if data is None:
+                return None
+            print("> " + tname + " => Reusing information about \"" + target['name'] + "\" crawled by an earlier match.")
+            return self.__reuse(target, data)
+        print("> " + tname + " => Scraping information about \"" + target['name'] + "\".")
+        data = None
+        try:
+            if self.config.engine == 'api':
+                data = self.__scrapApiMain(target, tname)
+            else:
+                driver = self.pool.acquire()
+                try:
+                    data = self.__scrapMain(driver, target, tname)
+                finally:
+                    self.pool.release(driver)
+        finally:
+            self.registry.complete(target['code'], data)
+        return data
+
+    def __recall(self, entry):
+        data, offset = self.registry.take(entry)
+        if data is None and not offset is None and not self.journal is None:
+            data = CompanyRecord.imports(self.journal.read(offset).get('data', None))
+        return data
+
+    def __reuse(self, target, data):
+        result = CompanyRecord(number = target['index'], paging = target['page'], company = target['name'], identity = target['code'], profile = target['href'])
+        for key in ('overview', 'histories', 'officers'):
+            if key in data:
+                result[key] = data[key]
+        return result
+
+    def __feed(self, tasks, done, pending, collect, workers = None):
+        following = 0
+        finished = 0
+        try:
+            while finished < len(pending):
+                if following < len(pending):
+                    try:
+                        tasks.put_nowait(pending[following])
+                        following += 1
+                        continue
+                    except Full:
+                        pass
+                try:
+                    position, res = done.get(timeout = WORKER_POLL)
+                except Empty:
+                    for process in (workers or []):
+                        if not process.is_alive():
+                            raise Exception("Worker " + process.name + " exited with code " + str(process.exitcode) + ", " + str(len(pending) - finished) + " companies were left unfinished.")
+                    continue
+                finished += 1
+                collect(position, res)
+                print("> Completed " + str(finished) + " of " + str(len(pending)) + " companies (" + str(get_percent_flo(finished, len(pending))) + "%).")
+        finally:
+            while True:
+                try:
+                    tasks.get_nowait()
+                except Empty:
+                    break
+
+    def __collect(self, query, targets, slots, position, res):
+        code = targets[position]['code']
+        if self.claiming:
+            self.registry.complete(code, res)
+        offset = self.journal.write('company', query = query, position = position, data = res)
+        if not res is None:
+            self.registry.stored(code, offset)
+        self.__emit(query, position, res)
+        slots[position] = res if self.retain else not res is None
+
+    def serve(self, tasks, results, pname = "Process", baseline = None):
+        '''
+        Crawl the (position, target) pairs from the task queue with the configured number of threads and put
+        every (position, result) pair to the results queue, returns once every thread has received the None sentinel.
+        @param baseline The previous filing histories loaded by the parent, read from the output folder when None
+        '''
+        mtask = self.config.thread
+        if mtask < 1: mtask = os.cpu_count()
+        self.baseline = baseline if not baseline is None else self.__loadBaseline()
+        self.registry = CompanyRegistry()
+        self.limiter = self.__createLimiter()
+        if self.config.profile:
+            self.profiler = ScrapProfiler()
+        self.pool = self.__createPool(mtask)
+        self.cache = self.__createCache()
+        workers = []
+        try:
+            for number in range(0, mtask, 1):
+                thread = ThreadTask(self.__scrapJob, '', tasks, results, pname + "-" + str(number + 1))
+                workers.append(thread)
+                thread.start()
+            for thread in workers:
+                thread.join()
+        finally:
+            self.__closeShared()
+            if not self.cache is None:
+                self.cache.close()
+                self.cache = None
+            with open(os.path.join(self.config.output, "metrics." + pname + ".json"), 'w') as file:
+                file.write(json.dumps(self.metrics.exports()))
+            if not self.profiler is None:
+                self.profiler.save(os.path.join(self.config.output, "profile." + pname + ".pstats"), os.path.join(self.config.output, "profile." + pname + ".collapsed"))
+                self.profiler = None
+
+    def __startProcesses(self):
+        mtask = self.config.thread
+        if mtask < 1: mtask = os.cpu_count()
+        size = self.config.procs * mtask
+        self.tasks = multiprocessing.Queue(size * 2)
+        self.done = multiprocessing.Queue()
+        settings = self.config.exports()
+        settings['scrap_rate'] = self.config.rate / self.config.procs
+        settings['scrap_rate_max'] = self.config.ratemax / self.config.procs
+        settings['restapi_budget'] = maxval(int(self.config.apibudget / self.config.procs), 1)
+        workers = []
+        print("> Starting " + str(self.config.procs) + " worker processes with " + str(mtask) + " threads each..")
+        for number in range(0, self.config.procs, 1):
+            process = ProcessTask(settings, self.tasks, self.done, number + 1, self.baseline)
+            workers.append(process)
+            process.start()
+        self.size = size
+        return workers
+
+    def __stopProcesses(self):
+        if self.workers is None:
+            return
+        if any(process.is_alive() for process in self.workers):
+            for number in range(0, self.size, 1):
+                self.tasks.put(None)
+        for process in self.workers:
+            process.join()
+        for process in self.workers:
+            path = os.path.join(self.config.output, "metrics." + process.name + ".json")
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, 'r') as file:
+                    self.metrics.merge(json.loads(file.read()))
+            finally:
+                os.remove(path)
+            if self.profiler is None:
+                continue
+            spath = os.path.join(self.config.output, "profile." + process.name + ".pstats")
+            cpath = os.path.join(self.config.output, "profile." + process.name + ".collapsed")
+            try:
+                self.profiler.merge(spath, cpath)
+            finally:
+                for path in (spath, cpath):
+                    if os.path.isfile(path):
+                        os.remove(path)
+        self.workers = None
+        self.tasks = None
+        self.done = None
+
+    def __startLoop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = AsyncHttpClient(self.config.concurrency)
+        self.semaphore = asyncio.Semaphore(self.config.concurrency)
+
+    def __stopLoop(self):
+        if self.loop is None:
+            return
+        self.client.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.loop = None
+        self.client = None
+        self.semaphore = None
+
+    def __emit(self, query, position, res):
+        sequence = self.sequence
+        if sequence['query'] != query:
+            sequence['query'] = query
+            sequence['next'] = 0
+            sequence['buffer'] = dict()
+        sequence['buffer'][position] = res
+        while sequence['next'] in sequence['buffer']:
+            current = sequence['next']
+            data = sequence['buffer'].pop(current)
+            sequence['next'] = current + 1
+            if data is None:
+                continue
+            data['number'] = self.number
+            self.number += 1
+            if not self.stream is None:
+                started = time.perf_counter()
+                self.__profiled('write_stream', self.stream.record, query, current, data)
+                self.metrics.observe('output', time.perf_counter() - started, 'jsonl')
+            if not self.excel is None:
+                started = time.perf_counter()
+                self.__profiled('write_excel', self.excel.record, query, data)
+                self.metrics.observe('output', time.perf_counter() - started, 'xlsx')
+            if not self.parquet is None:
+                started = time.perf_counter()
+                self.__profiled('write_parquet', self.parquet.record, query, data)
+                self.metrics.observe('output', time.perf_counter() - started, 'parquet')
+
+    def __scrapNode(self, query: str):
+        self.metrics.query = query
+        self.metrics.scope(query)
+        state = self.journal.state(query)
+        targets = state['targets']
+        if targets is None:
+            if not self.index is None:
+                targets = self.__profiled('scrap_page', self.__scrapIndexPage, query)
+            elif not self.loop is None:
+                targets = self.__profiled('scrap_page', self.loop.run_until_complete, self.__scrapPageAsync(query))
+            elif self.config.engine == 'api':
+                targets = self.__profiled('scrap_page', self.__scrapApiPage, query)
+            else:
+                targets = self.__profiled('scrap_page', self.__scrapPage, query)
+            self.journal.write('targets', query = query, targets = targets)
+        elif not state['header'] is None:
+            print('> Query "' + query + '" has completed in the previous run, restored from journal.')
+        else:
+            print('> Resuming query "' + query + '" with ' + str(len(state['results'])) + ' of ' + str(len(targets)) + ' companies restored from journal.')
+        array = dict()
+        header = dict()
+        header['keywords'] = query
+        header['datetime'] = datetime.datetime.now().isoformat()
+        header['companies'] = 0
+        header['elapsed'] = '00:00:00'
+        if not state['header'] is None:
+            header = state['header']
+        if len(targets) == 0:
+            array['header'] = header
+            self.journal.write('query', query = query, header = header)
+            return array
+        slots = [None] * len(targets)
+        pending = []
+        for position in range(0, len(targets), 1):
+            if position in state['results']:
+                res = state['results'].pop(position)
+                self.registry.seed(targets[position]['code'], None if res is None else state['offsets'].get(position, None))
+                self.__emit(query, position, res)
+                slots[position] = res if self.retain else not res is None
+            else:
+                pending.append((position, targets[position]))
+        collect = lambda position, res: self.__collect(query, targets, slots, position, res)
+        mtask = self.config.thread
+        if mtask < 1: mtask = os.cpu_count()
+        if self.claiming:
+            deferred = []
+            feed = []
+            for position, target in pending:
+                owner, entry = self.registry.claim(target['code'])
+                if owner:
+                    feed.append((position, target))
+                else:
+                    deferred.append((position, target, entry))
+            if not self.loop is None:
+                self.__profiled('scrap_task', self.loop.run_until_complete, self.__crawlAsync(feed, collect))
+            else:
+                print("> Dispatching " + str(len(feed)) + " companies to " + str(len(self.workers)) + " worker processes..")
+                self.__feed(self.tasks, self.done, feed, collect, self.workers)
+            for position, target, entry in deferred:
+                data = self.__recall(entry)
+                res = None if data is None else self.__reuse(target, data)
+                self.journal.write('company', query = query, position = position, data = res)
+                self.__emit(query, position, res)
+                slots[position] = res if self.retain else not res is None
+        elif mtask == 1 or len(pending) < 2:
+            for position, target in pending:
+                res = self.__scrapJob(query, target, "Thread-1")
+                collect(position, res)
+        else:
+            mtask = minval(mtask, len(pending))
+            print("> Maximum thread queue is: " + str(mtask))
+            tasks = Queue(mtask * 2)
+            done = Queue()
+            workers = []
+            for number in range(0, mtask, 1):
+                thread = ThreadTask(self.__scrapJob, query, tasks, done, number + 1)
+                workers.append(thread)
+                thread.start()
+            try:
+                self.__feed(tasks, done, pending, collect)
+            finally:
+                for thread in workers:
+                    tasks.put(None)
+            for thread in workers:
+                thread.join()
+        results = []
+        for res in slots:
+            if not res is None and not res is False:
+                results.append(res)
+        header['companies'] = len(results)
+        self.metrics.count('companies', None, len(results))
+        array['header'] = header
+        if self.retain:
+            array['matches'] = results
+        self.journal.write('query', query = query, header = header)
+        return array
+
+    def dispatch(self):
+        first = time.time()
+        result = dict()
+        header = dict()
+        header['queries'] = self.config.queries
+        found = []
+        array = []
+        headers = []
+        mtask = self.config.thread
+        if mtask < 1: mtask = os.cpu_count()
+        self.baseline = self.__loadBaseline()
+        self.retain = not self.config.stream
+        self.registry = CompanyRegistry()
+        self.sequence = { 'query': None, 'next': 0, 'buffer': dict() }
+        self.number = 1
+        self.journal = ScrapJournal(self.config.output, self.config.resume)
+        self.metrics = ScrapMetrics()
+        if self.config.profile:
+            self.profiler = ScrapProfiler()
+        if self.config.mport > 0:
+            self.metrics.serve(self.config.mport)
+        try:
+            self.journal.write('start', queries = self.config.queries, datetime = datetime.datetime.now().isoformat(), resume = self.config.resume)
+            self.limiter = self.__createLimiter()
+            self.pool = self.__createPool(mtask)
+            self.cache = self.__createCache()
+            if not isundefined(self.config.indexdb):
+                self.index = CompanyIndex(self.config.indexdb)
+            if self.config.procs > 1:
+                self.workers = self.__startProcesses()
+            if self.config.engine == 'async':
+                self.__startLoop()
+            self.claiming = not self.workers is None or not self.loop is None
+            if self.config.stream:
+                self.stream = JsonLinesWriter(self.config.output, self.config.queries)
+            self.excel = ExcelWriter(self.config.output)
+            if self.config.parquet:
+                self.parquet = ParquetWriter(self.config.output)
+            try:
+                for query in self.config.queries:
+                    data = self.__scrapNode(query)
+                    count = data['header']['companies']
+                    if count > 0:
+                        array.append(data)
+                    headers.append(data['header'])
+                    found.append(count)
+            finally:
+                self.__stopProcesses()
+                self.__stopLoop()
+                self.__closeShared()
+                if not self.cache is None:
+                    self.cache.close()
+                    self.cache = None
+                if not self.index is None:
+                    self.index.close()
+                    self.index = None
+            if self.registry.reused > 0:
+                print("> " + str(self.registry.reused) + " matches were shared between queries and crawled only once.")
+            e = int(time.time() - first)
+            header['elapsed'] = '{:02d}:{:02d}:{:02d}'.format(e // 3600, (e % 3600 // 60), e % 60)
+            header['matches'] = found
+            result['reports'] = header
+            result['results'] = array
+            started = time.perf_counter()
+            if not self.stream is None:
+                jpath = self.__profiled('write_stream', self.stream.finish, header, headers)
+                self.metrics.observe('output', time.perf_counter() - started, 'jsonl')
+            else:
+                jpath = self.__profiled('write_json', self.__writeJson, result)
+                self.metrics.observe('output', time.perf_counter() - started, 'json')
+            started = time.perf_counter()
+            xpath = self.__profiled('write_excel', self.excel.finish, headers)
+            self.metrics.observe('output', time.perf_counter() - started, 'xlsx')
+            ppaths = []
+            if not self.parquet is None:
+                started = time.perf_counter()
+                ppaths = self.__profiled('write_parquet', self.parquet.finish)
+                self.metrics.observe('output', time.perf_counter() - started, 'parquet')
+            self.metrics.save(os.path.dirname(jpath))
+            if not self.profiler is None:
+                spath, cpath = self.profiler.save(os.path.join(os.path.dirname(jpath), "profile.pstats"), os.path.join(os.path.dirname(jpath), "profile.collapsed"))
+                self.profiler = None
+                print("> Profile saved at: " + spath + " and " + cpath)
+            self.journal.write('finish', datetime = datetime.datetime.now().isoformat())
+        finally:
+            self.metrics.close()
+            if not self.profiler is None:
+                self.profiler.stop()
+                self.profiler = None
+            self.journal.close()
+            self.journal = None
+            if not self.stream is None:
+                self.stream.close()
+                self.stream = None
+            if not self.excel is None:
+                self.excel.close()
+                self.excel = None
+            if not self.parquet is None:
+                self.parquet.close()
+                self.parquet = None
+        return [jpath, xpath] + ppaths
+
+    def __writeJson(self, output):
+        folder = self.config.output
+        if not os.path.isabs(folder):
+            folder = os.path.abspath(folder)
+        path = os.path.join(folder, "results.json")
+        with open(path,'w') as file:
+            file.write(json.dumps(output, indent = 4, default = record_json))
+        return path
+
+
+class ScrapServer:
+    '''
+    Long-running job server, it keeps one warm driver pool and rate limiter per engine and runs the posted jobs
+    with their own ScrapProvider on top of them. Jobs are queued and at most "daemon_jobs" of them run at the same
+    time, every job streams its companies to "results.jsonl" which can be followed while the job is running.
+    The server owns the only metrics endpoint, the shared pools record into it and every finished job is merged into it.
+    '''
+
+    def __init__(self, config: ScrapSettings):
+        self.config = config
+        self.jobs = dict()
+        self.pools = dict()
+        self.limiters = dict()
+        self.metrics = ScrapMetrics()
+        self.sequence = 0
+        self._queue = Queue()
+        self._lock = Lock()
+        self._runners = []
+        self._server = None
+
+    def __shared(self, config: ScrapSettings):
+        engine = config.engine
+        with self._lock:
+            if not engine in self.pools:
+                base = ScrapSettings()
+                base.imports(self.config.exports())
+                base.engine = engine
+                size = base.thread if base.thread > 0 else os.cpu_count()
+                self.pools[engine] = create_pool(base, size, self.metrics)
+                self.limiters[engine] = create_limiter(base)
+            return self.pools[engine], self.limiters[engine]
+
+    def warmup(self):
+        '''
+        Start every driver of the pool of the default engine so the first jobs do not pay the browser startup.
+        '''
+        base = ScrapSettings()
+        base.imports(self.config.exports())
+        base.queries = ['warmup']
+        base.prepare()
+        pool, limiter = self.__shared(base)
+        if base.engine == 'api':
+            return
+        size = base.thread if base.thread > 0 else os.cpu_count()
+        print("> Warming up " + str(size) + " drivers for the \"" + base.engine + "\" engine..")
+        drivers = []
+        try:
+            for number in range(0, size, 1):
+                drivers.append(pool.acquire())
+        finally:
+            for driver in drivers:
+                pool.release(driver)
+
+    def submit(self, request: dict):
+        '''
+        Validate a job request and queue it, returns the job record.
+        @param request Dictionary with "queries" (list or comma separated string) and optional "settings" overrides
+            using the configuration file keys, the driver options are shared by every job and cannot be overridden,
+            an "output_folder" is taken relative to the "jobs" folder of the server output and must stay inside it
+        '''
+        queries = request.get('queries', None)
+        if isinstance(queries, str):
+            queries = [text.strip() for text in queries.split(',') if not isundefined(text.strip())]
+        queries = convertlist(queries)
+        if isundefined(queries):
+            raise ValueError('The job has no "queries".')
+        overrides = request.get('settings', dict())
+        if not isinstance(overrides, dict):
+            raise ValueError('The job "settings" must be an object of configuration file keys.')
+        data = self.config.exports()
+        for key in overrides:
+            if not key in data:
+                raise ValueError('The setting "' + key + '" is not known.')
+            if key.startswith('driver_') or key.startswith('daemon_') or key in ('scrap_processes', 'metrics_port', 'index_source'):
+                raise ValueError('The setting "' + key + '" is shared by every job and cannot be overridden.')
+            data[key] = overrides[key]
+        root = os.path.realpath(os.path.join(self.config.output, 'jobs'))
+        if 'output_folder' in overrides:
+            folder = os.path.realpath(os.path.join(root, convertstr(overrides['output_folder'])))
+            if folder == root or os.path.commonpath([root, folder]) != root:
+                raise ValueError('The setting "output_folder" must be a folder inside "' + root + '".')
+            data['output_folder'] = folder
+        with self._lock:
+            self.sequence += 1
+            jid = str(self.sequence)
+        if not 'output_folder' in overrides:
+            data['output_folder'] = os.path.join(root, jid)
+        data['company_names'] = queries
+        data['output_stream'] = True
+        data['metrics_port'] = 0
+        config = ScrapSettings()
+        config.imports(data)
+        config.prepare()
+        job = { 'id': jid, 'state': 'queued', 'queries': queries, 'settings': overrides, 'engine': config.engine, 'output': config.output,
+            'stream': os.path.join(config.output, 'results.jsonl'), 'files': [], 'error': None, 'created': datetime.datetime.now().isoformat(), 'started': None, 'finished': None }
+        with self._lock:
+            self.jobs[jid] = job
+            self.__prune()
+        self._queue.put((job, config))
+        print("> Job " + jid + " queued with " + str(len(queries)) + " queries.")
+        return job
+
+    def __prune(self):
+        done = [jid for jid in self.jobs if self.jobs[jid]['state'] in ('done', 'failed')]
+        while len(done) > 1000:
+            self.jobs.pop(done.pop(0), None)
+
+    def __run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            job, config = item
+            job['state'] = 'running'
+            job['started'] = datetime.datetime.now().isoformat()
+            provider = None
+            try:
+                pool, limiter = self.__shared(config)
+                provider = ScrapProvider(config, pool, limiter)
+                job['files'] = provider.dispatch()
+                job['state'] = 'done'
+            except Exception as e:
+                job['error'] = str(e)
+                job['state'] = 'failed'
+                print("> Job " + job['id'] + " failed: " + str(e))
+            if not provider is None:
+                self.metrics.merge(provider.metrics.exports())
+            job['finished'] = datetime.datetime.now().isoformat()
+
+    def job(self, jid: str):
+        with self._lock:
+            job = self.jobs.get(jid, None)
+            return None if job is None else dict(job)
+
+    def listing(self):
+        with self._lock:
+            return [dict(self.jobs[jid]) for jid in self.jobs]
+
+    def start(self, port: int):
+        '''
+        Start the job runners and the HTTP endpoint at http://127.0.0.1:<port>, returns the bound port.
+        '''
+        for number in range(0, self.config.djobs, 1):
+            runner = Thread(target = self.__run, name = "Job-" + str(number + 1), daemon = True)
+            self._runners.append(runner)
+            runner.start()
+        if self.config.mport > 0:
+            self.metrics.serve(self.config.mport)
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), ScrapHandler)
+        self._server.daemon_threads = True
+        self._server.scraper = self
+        Thread(target = self._server.serve_forever, name = "Server", daemon = True).start()
+        port = self._server.server_address[1]
+        print("> Job server listening at http://127.0.0.1:" + str(port) + "/jobs with " + str(self.config.djobs) + " concurrent jobs.")
+        return port
+
+    def close(self):
+        if not self._server is None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for runner in self._runners:
+            self._queue.put(None)
+        for runner in self._runners:
+            runner.join()
+        self._runners = []
+        for engine in self.pools:
+            self.pools[engine].close()
+        self.pools = dict()
+        self.limiters = dict()
+        self.metrics.close()
+
+class ScrapHandler ( BaseHTTPRequestHandler ):
+    '''
+    HTTP endpoint of the job server:
+    POST /jobs queues a job, GET /jobs lists the jobs, GET /jobs/<id> returns one job and
+    GET /jobs/<id>/results streams its JSON Lines results until the job is finished.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def __reply(self, status: int, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __chunk(self, data: bytes):
+        self.wfile.write(('%x' % len(data)).encode('ascii') + b'\r\n' + data + b'\r\n')
+        self.wfile.flush()
+
+    def __opened(self, job: dict):
+        if job['started'] is None:
+            return False
+        try:
+            with open(os.path.join(job['output'], 'results.manifest.json'), 'r', encoding = 'utf-8') as file:
+                manifest = json.loads(file.read())
+        except:
+            return False
+        return manifest.get('datetime', '') >= job['started']
+
+    def __stream(self, jid: str):
+        scraper = self.server.scraper
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        offset = 0
+        opened = False
+        while True:
+            job = scraper.job(jid)
+            finished = job['state'] in ('done', 'failed')
+            if not opened:
+                opened = self.__opened(job)
+            if opened and os.path.isfile(job['stream']):
+                with open(job['stream'], 'rb') as file:
+                    file.seek(offset)
+                    data = file.read()
+                cut = data.rfind(b'\n') + 1
+                if cut > 0:
+                    self.__chunk(data[:cut])
+                    offset += cut
+            if finished:
+                break
+            time.sleep(0.2)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_GET(self):
+        scraper = self.server.scraper
+        parts = [part for part in self.path.split('?')[0].split('/') if len(part) > 0]
+        if parts == ['jobs']:
+            self.__reply(200, scraper.listing())
+            return
+        if len(parts) < 2 or len(parts) > 3 or parts[0] != 'jobs':
+            self.__reply(404, { 'error': 'Not found.' })
+            return
+        job = scraper.job(parts[1])
+        if job is None:
+            self.__reply(404, { 'error': 'The job "' + parts[1] + '" is not found.' })
+        elif len(parts) == 2:
+            self.__reply(200, job)
+        elif parts[2] == 'results':
+            self.__stream(parts[1])
+        else:
+            self.__reply(404, { 'error': 'Not found.' })
+
+    def do_POST(self):
+        if self.path.split('?')[0].rstrip('/') != '/jobs':
+            self.__reply(404, { 'error': 'Not found.' })
+            return
+        try:
+            length = int(self.headers.get('Content-Length', '0'))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError('The job request must be a JSON object.')
+            job = self.server.scraper.submit(request)
+        except Exception as e:
+            self.__reply(400, { 'error': str(e) })
+            return
+        self.__reply(202, job)
+
+    def log_message(self, format, *args):
+        pass
+
+def main(args = None):
+    '''
+    Command line entry point, loads the settings from the given arguments (the process arguments by default)
+    or from the configuration file, runs the scraper and returns the process exit code.
+    @param args The command line arguments without the program name
+    '''
+    print("> Initializing web scraper, please wait..")
+    settings = ScrapSettings()
+    print("> Loading web scraper settings..")
+    settings.reload(args)
+    if not isundefined(settings.indexcsv):
+        try:
+            CompanyIndex(settings.indexdb).build(settings.indexcsv)
+        except Exception as e:
+            print("> Import Error: " + str(e))
+            return 1
+        settings.indexcsv = ''
+        if isundefined(settings.queries) and settings.dport < 1:
+            return 0
+    if settings.dport > 0:
+        server = ScrapServer(settings)
+        try:
+            server.warmup()
+            server.start(settings.dport)
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("> Stopping the job server..")
+        finally:
+            server.close()
+        return 0
+    print("> Initializing web scraper engine..")
+    provider = ScrapProvider(settings)
+    print("> Engine ready, starting scrap..")
+    try:
+        output = provider.dispatch()
+        print("> Operation success..")
+        print("> Result with format JSON has saved: " + output[0])
+        print("> Result with format XLSX has saved: " + output[1])
+        for path in output[2:]:
+            print("> Result with format Parquet has saved: " + path)
+        return 0
+    except Exception as e:
+        print("> Scraping Error: " + str(e))
+        return 1
 
-print("> Initializing web scraper, please wait..")
-settings = ScrapSettings()
-print("> Loading web scraper settings..")
-settings.reload()
-print("> Initializing web scraper engine..")
-provider = ScrapProvider(settings)
-print("> Engine ready, starting scrap..")
-try:
-    output = provider.dispatch()
-    print("> Operation success..")
-    print("> Result with format JSON has saved: " + output[0])
-    print("> Result with format XLSX has saved: " + output[1])
-except Exception as e:
-    print("> Scraping Error: " + str(e))
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
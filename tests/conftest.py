@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import FixtureSite
+
+@pytest.fixture
+def site():
+    '''
+    Synthetic Companies House site with 45 companies, 3 officers and 30 filings each, yields the site and its address.
+    '''
+    fixture = FixtureSite(45, 3, 30, 0.0)
+    landing = fixture.start()
+    try:
+        yield fixture, landing
+    finally:
+        fixture.stop()
+
+def scrap_settings(landing: str, output: str, engine: str = 'http', query: str = 'alpha'):
+    '''
+    Build the settings of a quick crawl of the fixture site without pacing.
+    '''
+    from chscraper import ScrapSettings
+    settings = ScrapSettings([query], output)
+    settings.landing = landing
+    settings.engine = engine
+    settings.thread = 4
+    settings.procs = 0
+    settings.mrows = 0
+    settings.mpage = 0
+    settings.rate = 0.0
+    settings.ratemax = 0.0
+    if engine == 'api':
+        settings.apiurl = landing + '/api'
+        settings.apikey = 'test'
+        settings.apibudget = 1000000
+    return settings
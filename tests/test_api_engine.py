@@ -0,0 +1,21 @@
+import json
+import os
+
+from chscraper import ScrapProvider
+from conftest import scrap_settings
+
+def crawl(landing: str, output: str, engine: str):
+    settings = scrap_settings(landing, output, engine)
+    ScrapProvider(settings).dispatch()
+    with open(os.path.join(output, 'results.json'), 'r') as file:
+        return json.loads(file.read())['results']
+
+def test_api_engine_matches_http_engine(site, tmp_path):
+    fixture, landing = site
+    pages = crawl(landing, str(tmp_path / 'http'), 'http')
+    api = crawl(landing, str(tmp_path / 'api'), 'api')
+    assert len(pages) == len(api) == 1
+    assert len(pages[0]['matches']) == 45
+    for left, right in zip(pages[0]['matches'], api[0]['matches']):
+        assert left == right
+    assert pages[0]['matches'] == api[0]['matches']
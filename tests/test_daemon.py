@@ -0,0 +1,55 @@
+import json
+import os
+import socket
+import urllib.request
+
+import pytest
+
+from chscraper import ScrapServer
+from conftest import scrap_settings
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def post(base: str, data: dict):
+    request = urllib.request.Request(base + '/jobs', json.dumps(data).encode('utf-8'), { 'Content-Type': 'application/json' })
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def get(url: str):
+    with urllib.request.urlopen(url) as response:
+        return response.read().decode('utf-8')
+
+def test_concurrent_jobs_share_one_metrics_endpoint(site, tmp_path):
+    fixture, landing = site
+    settings = scrap_settings(landing, str(tmp_path))
+    settings.officer = False
+    settings.history = False
+    settings.djobs = 2
+    settings.mport = free_port()
+    server = ScrapServer(settings)
+    try:
+        base = 'http://127.0.0.1:' + str(server.start(0))
+        jobs = [post(base, { 'queries': ['alpha'] }), post(base, { 'queries': ['beta'] })]
+        for job in jobs:
+            lines = get(base + '/jobs/' + job['id'] + '/results').splitlines()
+            assert len(lines) == 45
+        for job in jobs:
+            data = json.loads(get(base + '/jobs/' + job['id']))
+            assert data['state'] == 'done', data['error']
+        text = get('http://127.0.0.1:' + str(settings.mport) + '/metrics')
+        assert 'stage="driver_start"' in text
+        assert 'query="alpha"' in text and 'query="beta"' in text
+    finally:
+        server.close()
+
+def test_output_folder_must_stay_inside_the_jobs_folder(tmp_path):
+    settings = scrap_settings('http://127.0.0.1:1', str(tmp_path))
+    server = ScrapServer(settings)
+    for folder in ['..', '../elsewhere', str(tmp_path / 'elsewhere'), '/tmp', 'nightly/../..']:
+        with pytest.raises(ValueError):
+            server.submit({ 'queries': ['alpha'], 'settings': { 'output_folder': folder } })
+    job = server.submit({ 'queries': ['alpha'], 'settings': { 'output_folder': 'nightly' } })
+    assert job['output'] == os.path.join(os.path.realpath(str(tmp_path / 'jobs')), 'nightly')
@@ -0,0 +1,107 @@
+import json
+import os
+
+import pytest
+
+from benchmark import FixtureSite
+from chscraper import HttpClient, HttpDriver, ScrapProvider, page_snapshot, extract_matches, extract_hits, extract_overview, extract_officers, extract_histories, extract_next_page
+from conftest import scrap_settings
+
+def snapshot(landing: str, path: str):
+    driver = HttpDriver(HttpClient(2))
+    driver.get(landing + path)
+    assert driver.status == 200
+    return page_snapshot(driver)
+
+def test_extract_matches_reads_grouped_count():
+    site = FixtureSite(1234, 1, 1, 0.0)
+    landing = site.start()
+    try:
+        assert extract_matches(snapshot(landing, '/search/companies?q=alpha')) == 1234
+    finally:
+        site.stop()
+
+def test_extract_hits(site):
+    fixture, landing = site
+    hits = extract_hits(snapshot(landing, '/search/companies?q=alpha'))
+    assert len(hits) == 20
+    assert hits[0]['title'] == 'ALPHA COMPANY 0 LIMITED'
+    assert hits[0]['code'] == '00000000'
+    assert hits[0]['href'].endswith('/company/00000000')
+    last = extract_hits(snapshot(landing, '/search/companies?q=alpha&page=3'))
+    assert [hit['code'] for hit in last] == ['%08d' % index for index in range(40, 45)]
+
+def test_extract_overview(site):
+    fixture, landing = site
+    data = extract_overview(snapshot(landing, '/company/00000007'), 'ALPHA COMPANY 7 LIMITED')
+    assert data['name'] == 'ALPHA COMPANY 7 LIMITED'
+    assert data['address'] == '1 High Street, London, EC1 1AA'
+    assert data['status'] == 'Active'
+    assert data['type'] == 'Private limited Company'
+    assert data['incorporated'] == '1 January 2000'
+    assert not 'dissolved' in data
+
+def test_extract_officers(site):
+    fixture, landing = site
+    officers = extract_officers(snapshot(landing, '/company/00000007/officers'))
+    assert [data['name'] for data in officers] == ['SMITH, John 1', 'SMITH, John 2', 'SMITH, John 3']
+    data = officers[0]
+    assert data['role'] == 'Director'
+    assert data['birth'] == 'March 1970'
+    assert data['nationality'] == 'British'
+    assert data['residence'] == 'England'
+    assert data['appointed'] == '1 January 2000'
+
+def test_extract_histories_and_next_page(site):
+    fixture, landing = site
+    root = snapshot(landing, '/company/00000007/filing-history')
+    rows = extract_histories(root)
+    assert len(rows) == 25
+    assert rows[0]['no'] == 1
+    assert rows[0]['date'] == '2 Jan 2020'
+    assert rows[0]['desc'] == 'Confirmation statement made on 2 January 2020'
+    assert rows[0]['docs'].endswith('/company/00000007/filing-history/F29/document?format=pdf')
+    href = extract_next_page(root)
+    assert href.endswith('?page=2')
+    root = snapshot(landing, '/company/00000007/filing-history?page=2')
+    rows = extract_histories(root, 26)
+    assert [data['no'] for data in rows] == [26, 27, 28, 29, 30]
+    assert extract_next_page(root) is None
+
+class FlakySite ( FixtureSite ):
+    '''
+    Fixture site dropping the connection of the second result page the given number of times.
+    '''
+
+    def __init__(self, failures: int):
+        FixtureSite.__init__(self, 45, 1, 1, 0.0)
+        self.failures = failures
+        self.failed = 0
+
+    def search(self, query: str, page: int):
+        if page == 2 and self.failed < self.failures:
+            self.failed += 1
+            raise ConnectionResetError('dropped result page')
+        return FixtureSite.search(self, query, page)
+
+def crawl(site: FixtureSite, output: str):
+    landing = site.start()
+    try:
+        settings = scrap_settings(landing, output)
+        settings.history = False
+        settings.officer = False
+        ScrapProvider(settings).dispatch()
+    finally:
+        site.stop()
+    with open(os.path.join(output, 'results.json'), 'r') as file:
+        return json.loads(file.read())['results'][0]['matches']
+
+def test_failed_result_page_is_retried(tmp_path):
+    site = FlakySite(2)
+    matches = crawl(site, str(tmp_path))
+    assert site.failed == 2
+    assert len(matches) == 45
+
+def test_failing_result_page_fails_the_query(tmp_path):
+    with pytest.raises(Exception):
+        crawl(FlakySite(1000), str(tmp_path))
@@ -0,0 +1,26 @@
+import os
+import time
+
+from chscraper import ScrapProvider
+from conftest import scrap_settings
+
+def crawl(landing: str, output: str, stream: bool, increment: bool = False):
+    settings = scrap_settings(landing, output)
+    settings.officer = False
+    settings.stream = stream
+    settings.increment = increment
+    provider = ScrapProvider(settings)
+    provider.dispatch()
+    return provider
+
+def test_baseline_is_read_from_the_latest_results(site, tmp_path):
+    fixture, landing = site
+    output = str(tmp_path)
+    crawl(landing, output, False)
+    fixture.filings = 35
+    time.sleep(0.05)
+    crawl(landing, output, True)
+    assert os.path.getmtime(os.path.join(output, 'results.jsonl')) > os.path.getmtime(os.path.join(output, 'results.json'))
+    provider = crawl(landing, output, False, True)
+    assert len(provider.baseline) == 45
+    assert len(provider.baseline['00000000']) == 35
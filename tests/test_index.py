@@ -0,0 +1,53 @@
+import csv
+import json
+
+import pytest
+
+from chscraper import CompanyIndex, ScrapProvider
+from conftest import scrap_settings
+
+NAMES = ['PROPERTY SOURCE LIMITED', 'PROPERTY HOLDINGS LIMITED', 'OPEN SOURCE PROPERTIES LTD', 'ALPHA COMPANY LTD', 'ALPHABET HOLDINGS LTD']
+
+def build_index(folder, names: list):
+    source = str(folder / 'snapshot.csv')
+    with open(source, 'w', newline = '') as file:
+        writer = csv.writer(file)
+        writer.writerow(['CompanyName', ' CompanyNumber', 'RegAddress.PostCode', 'CompanyCategory', 'CompanyStatus', 'IncorporationDate'])
+        for name, code in names:
+            writer.writerow([name, code, 'EC1 1AA', 'Private Limited Company', 'Active', '01/01/2000'])
+    index = CompanyIndex(str(folder / 'index.db'))
+    index.build(source)
+    return index
+
+@pytest.fixture
+def index(tmp_path):
+    index = build_index(tmp_path, [(name, '%08d' % number) for number, name in enumerate(NAMES)])
+    try:
+        yield index
+    finally:
+        index.close()
+
+def test_every_term_matches_as_prefix(index):
+    assert sorted(hit['title'] for hit in index.search('prop sour')) == ['OPEN SOURCE PROPERTIES LTD', 'PROPERTY SOURCE LIMITED']
+    assert [hit['title'] for hit in index.search('alph comp')] == ['ALPHA COMPANY LTD']
+    assert sorted(hit['title'] for hit in index.search('alpha')) == ['ALPHA COMPANY LTD', 'ALPHABET HOLDINGS LTD']
+    assert index.search('holdings prop', False) == []
+
+def test_threshold_is_applied_before_the_row_limit(site, tmp_path):
+    fixture, landing = site
+    names = [('ALPHA' + letter + ' HOLDINGS' + letter + ' LTD', '%08d' % number) for number, letter in enumerate('ABCDEFGHIJKLMNOPQRTU')]
+    names += [('THE ALPHA HOLDINGS LIMITED', '00000100'), ('ALPHA HOLDINGS INTERNATIONAL LIMITED', '00000101')]
+    index = build_index(tmp_path, names)
+    assert all(hit['code'] < '00000100' for hit in index.search('alpha holdings', True, 2))
+    index.close()
+    settings = scrap_settings(landing, str(tmp_path / 'output'), query = 'alpha holdings')
+    settings.indexdb = index.path
+    settings.exactly = True
+    settings.mscore = 0.85
+    settings.mrows = 2
+    settings.officer = False
+    settings.history = False
+    ScrapProvider(settings).dispatch()
+    with open(str(tmp_path / 'output' / 'results.json'), 'r') as file:
+        matches = json.loads(file.read())['results'][0]['matches']
+    assert sorted(data['identity'] for data in matches) == ['00000100', '00000101']
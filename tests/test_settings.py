@@ -0,0 +1,10 @@
+import pytest
+
+from chscraper import parse_args
+
+@pytest.mark.parametrize('flag', ['incremental', 'cache', 'resume', 'profile', 'stream', 'parquet'])
+def test_boolean_flags_read_false(flag):
+    base = ['--query', 'alpha', '--output', 'output', '--limit', '0']
+    assert parse_args(base + ['--' + flag, 'False'])[flag] is False
+    assert parse_args(base + ['--' + flag, 'True'])[flag] is True
+    assert parse_args(base)[flag] is False